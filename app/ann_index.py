@@ -0,0 +1,214 @@
+import os
+import glob
+import math
+import logging
+from typing import Optional
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+ANN_BACKENDS = ("auto", "exact", "ivf", "hnsw")
+
+
+class IVFFlatIndex:
+    """Inverted-file index over a normalized matrix, NumPy only.
+
+    Rows are clustered with spherical k-means into ``nlist`` lists. A query
+    scans the centroids, then only the rows of its ``nprobe`` closest lists,
+    so the work per query grows with about sqrt(n) instead of n. The index
+    holds row numbers only; vectors stay in the caller's matrix.
+    """
+
+    backend = "ivf"
+    suffix = "npz"
+
+    def __init__(self, nprobe: int = 16):
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        # Rows grouped by list: list i owns rows[offsets[i]:offsets[i + 1]]
+        self.offsets: Optional[np.ndarray] = None
+        self.rows: Optional[np.ndarray] = None
+
+    def build(self, matrix: np.ndarray, nlist: int = 0, iterations: int = 10, seed: int = 0):
+        count = matrix.shape[0]
+        nlist = min(nlist or max(1, int(4 * math.sqrt(count))), count)
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample; 64 points per list is plenty for k-means
+        sample_size = min(count, nlist * 64)
+        sample = np.asarray(matrix[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            # Per-list sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(assignment, kind="stable")
+            sizes = np.bincount(assignment, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            nonempty = sizes > 0
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+            sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty lists from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        assignment = np.empty(count, dtype=np.int32)
+        for start in range(0, count, 65536):
+            block = np.asarray(matrix[start:start + 65536])
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        self.centroids = centroids
+        self.rows = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=self.offsets[1:])
+        logger.info(f"🗂️ IVF index built: {count} vectors in {nlist} lists")
+
+    def candidates(self, query_vector: np.ndarray, top_k: int) -> np.ndarray:
+        """Rows of the nprobe lists closest to the query"""
+        nlist = len(self.centroids)
+        nprobe = min(self.nprobe, nlist)
+        centroid_scores = self.centroids @ query_vector
+        if nprobe < nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(nlist)
+        return np.concatenate(
+            [self.rows[self.offsets[i]:self.offsets[i + 1]] for i in probe]
+        )
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, rows=self.rows)
+
+    def load(self, path: str, count: int, dim: int) -> bool:
+        with np.load(path) as data:
+            centroids, offsets, rows = data["centroids"], data["offsets"], data["rows"]
+        if centroids.shape[1] != dim or len(rows) != count:
+            return False
+        self.centroids, self.offsets, self.rows = centroids, offsets, rows
+        return True
+
+
+class HNSWIndex:
+    """HNSW graph index from the optional ``hnswlib`` package"""
+
+    backend = "hnsw"
+    suffix = "bin"
+
+    def __init__(self, ef: int = 128, m: int = 16, ef_construction: int = 200):
+        if hnswlib is None:
+            raise ImportError("hnswlib is required for the hnsw ANN backend")
+        self.ef = ef
+        self.m = m
+        self.ef_construction = ef_construction
+        self._index = None
+
+    def build(self, matrix: np.ndarray, **_):
+        count, dim = matrix.shape
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(
+            max_elements=count, ef_construction=self.ef_construction, M=self.m
+        )
+        for start in range(0, count, 65536):
+            block = np.asarray(matrix[start:start + 65536])
+            self._index.add_items(block, np.arange(start, start + len(block)))
+        self._index.set_ef(self.ef)
+        logger.info(f"🕸️ HNSW index built: {count} vectors (M={self.m})")
+
+    def candidates(self, query_vector: np.ndarray, top_k: int) -> np.ndarray:
+        k = min(top_k, self._index.get_current_count())
+        self._index.set_ef(max(self.ef, k))
+        labels, _ = self._index.knn_query(query_vector, k=k)
+        return labels[0].astype(np.int64)
+
+    def save(self, path: str):
+        self._index.save_index(path)
+
+    def load(self, path: str, count: int, dim: int) -> bool:
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(path, max_elements=count)
+        if index.get_current_count() != count:
+            return False
+        index.set_ef(self.ef)
+        self._index = index
+        return True
+
+
+def create_ann_index(backend: str, count: int, min_size: int = 20000):
+    """ANN index for the backend, or None for exact search.
+
+    ``auto`` keeps exact search below ``min_size`` vectors, where a full
+    matrix product is already fast, and prefers HNSW when hnswlib is installed.
+    """
+    backend = backend.lower()
+    if backend not in ANN_BACKENDS:
+        raise ValueError(f"Unknown ANN backend {backend!r}, expected one of {ANN_BACKENDS}")
+
+    if backend == "exact" or (backend == "auto" and count < min_size) or count == 0:
+        return None
+    if backend == "auto":
+        backend = "hnsw" if hnswlib is not None else "ivf"
+
+    if backend == "hnsw":
+        return HNSWIndex(
+            ef=int(os.getenv("ANN_EF", "128")), m=int(os.getenv("ANN_M", "16"))
+        )
+    return IVFFlatIndex(nprobe=int(os.getenv("ANN_NPROBE", "16")))
+
+
+def load_or_build_ann_index(
+    matrix: np.ndarray,
+    version: str,
+    directory: Optional[str] = None,
+    backend: Optional[str] = None,
+):
+    """Load the persisted ANN index for this matrix version, or build it.
+
+    Indexes are saved as ``ann-<backend>-<version>.<ext>`` next to the
+    embedding store; files for older versions are removed on save. Returns
+    None when exact search should be used.
+    """
+    count, dim = matrix.shape
+    ann = create_ann_index(
+        backend or os.getenv("ANN_BACKEND", "auto"),
+        count,
+        min_size=int(os.getenv("ANN_MIN_SIZE", "20000")),
+    )
+    if ann is None:
+        return None
+
+    path = None
+    if directory:
+        path = os.path.join(directory, f"ann-{ann.backend}-{version}.{ann.suffix}")
+        if os.path.exists(path):
+            try:
+                if ann.load(path, count, dim):
+                    logger.info(f"✅ Loaded {ann.backend} ANN index from {path}")
+                    return ann
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load ANN index, rebuilding: {e}")
+
+    ann.build(matrix, nlist=int(os.getenv("ANN_NLIST", "0")))
+
+    if path and os.access(directory, os.W_OK):
+        try:
+            tmp_path = os.path.join(directory, f".ann-{ann.backend}.tmp")
+            ann.save(tmp_path)
+            os.replace(tmp_path, path)
+            for stale in glob.glob(os.path.join(directory, f"ann-{ann.backend}-*")):
+                if stale != path:
+                    os.remove(stale)
+            logger.info(f"💾 Saved {ann.backend} ANN index to {path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save ANN index: {e}")
+
+    return ann
@@ -0,0 +1,126 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, FrozenSet, Optional
+
+try:
+    from .vector_index import VectorIndex
+except ImportError:
+    from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Near neighbours checked for one naming the same entities as the question
+_CANDIDATES = 4
+
+
+class SemanticAnswerCache:
+    """Cache of complete answers, looked up by query embedding similarity.
+
+    A question whose embedding is within ``threshold`` cosine similarity of a
+    cached question, and that names exactly the same entities (phones, areas,
+    provinces, ...), gets the cached answer: "khu vực 2" and "khu vực 4"
+    questions embed almost identically but need different offices. Every
+    entry belongs to one index version; when the corpus (and so the index
+    version) changes, the whole cache is dropped.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        threshold: float = 0.97,
+        max_entries: int = 512,
+        ttl_seconds: float = 6 * 3600,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._index = VectorIndex(dim=dim, initial_capacity=max(max_entries, 1))
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.threshold <= 1.0
+
+    def _check_version(self, index_version: str):
+        if self._version != index_version:
+            if self._entries:
+                logger.info("🧹 Index version changed - clearing answer cache")
+            self._index.remove(list(self._entries))
+            self._entries.clear()
+            self._version = index_version
+
+    def lookup(
+        self,
+        query_vector,
+        index_version: str,
+        entities: FrozenSet[str] = frozenset(),
+    ) -> Optional[str]:
+        """Return a cached answer for a near-identical question, if any"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._check_version(index_version)
+
+            now = time.time()
+            for entry_id, similarity in self._index.search(query_vector, top_k=_CANDIDATES):
+                if similarity < self.threshold:
+                    break
+                answer, created, entry_entities = self._entries[entry_id]
+                if now - created > self.ttl_seconds:
+                    self._index.remove([entry_id])
+                    del self._entries[entry_id]
+                    continue
+                if entry_entities == entities:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    logger.info(f"⚡ Answer cache hit (similarity {similarity:.3f})")
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query_vector,
+        index_version: str,
+        answer: str,
+        entities: FrozenSet[str] = frozenset(),
+    ) -> None:
+        """Remember the full answer to a question naming ``entities``"""
+        if not self.enabled or not answer:
+            return
+
+        with self._lock:
+            self._check_version(index_version)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add([entry_id], query_vector)
+            self._entries[entry_id] = (answer, time.time(), frozenset(entities))
+
+            while len(self._entries) > self.max_entries:
+                oldest_id, _ = self._entries.popitem(last=False)
+                self._index.remove([oldest_id])
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /status"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "index_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,277 @@
+"""ASGI entry point: async streaming /ask, everything else served by Flask.
+
+Run with ``uvicorn asgi:application`` or gunicorn's ``UvicornWorker``. A
+streamed answer only holds an open socket and an awaiting coroutine, so one
+process serves many concurrent /ask streams instead of one per worker.
+/ready is answered on the event loop; other Flask routes run on a pool of
+``FLASK_THREADS`` threads.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+try:
+    from .sse import acoalesce_tokens, encode_answer, sse_event, wants_event_stream
+    from .main import (
+        app,
+        get_rag_function,
+        get_async_rag_function,
+        get_fallback_response,
+        is_rag_ready,
+        rag_readiness,
+        warm_up_rag,
+    )
+except ImportError:
+    from sse import acoalesce_tokens, encode_answer, sse_event, wants_event_stream
+    from main import (
+        app,
+        get_rag_function,
+        get_async_rag_function,
+        get_fallback_response,
+        is_rag_ready,
+        rag_readiness,
+        warm_up_rag,
+    )
+
+logger = logging.getLogger(__name__)
+
+ASK_PATHS = ("/ask", "/ask-enhanced")
+
+# asgiref's WsgiToAsgi runs every request on one shared thread
+# (thread_sensitive=True), so a long /api/convert would stall /status and
+# queue uploads behind each other; Flask requests get their own pool instead
+_flask_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FLASK_THREADS", "16")), thread_name_prefix="flask"
+)
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        # The plain function behind the base class's @sync_to_async decorator
+        run = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+        await sync_to_async(run, thread_sensitive=False, executor=_flask_executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that runs each request on a thread of ``_flask_executor``"""
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+flask_application = PooledWsgiToAsgi(app)
+
+
+def _sse(payload: dict) -> bytes:
+    return sse_event(payload).encode("utf-8")
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+async def _iterate_in_thread(iterator):
+    """Drive a blocking generator from the event loop, one item per thread hop"""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+async def _answer_stream(question, conversation_history):
+    """Token stream from the async backend, or the sync one run in threads"""
+    async_function = await asyncio.to_thread(get_async_rag_function)
+    if async_function is not None:
+        async for chunk in async_function(question, conversation_history):
+            yield chunk
+        return
+
+    rag_function = get_rag_function()
+    if rag_function is None:
+        logger.error("❌ RAG function is not available.")
+        rag_function = get_fallback_response()
+
+    stream = await asyncio.to_thread(rag_function, question, conversation_history)
+    async for chunk in _iterate_in_thread(iter(stream)):
+        yield chunk
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b""
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_plain(send, status: int, text: str):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+        }
+    )
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+async def _send_json_answer(scope, send, question, conversation_history):
+    """Whole answer as (optionally gzipped) JSON for non-SSE clients"""
+    try:
+        answer = "".join([chunk async for chunk in _answer_stream(question, conversation_history)])
+    except Exception as e:
+        logger.error(f"❌ RAG error: {str(e)}")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": json.dumps({"error": f"RAG error: {str(e)}"}).encode()}
+        )
+        return
+
+    body, content_encoding = encode_answer(answer, _header(scope, b"accept-encoding"))
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"vary", b"Accept, Accept-Encoding"),
+    ]
+    if content_encoding:
+        headers.append((b"content-encoding", content_encoding.encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def ask(scope, receive, send):
+    """Async twin of the Flask /ask view: same request body, same SSE events"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+    except ValueError:
+        data = {}
+    question = data.get("question")
+    conversation_history = data.get("conversation_history", [])
+
+    logger.info(f"\n🌐 ASGI REQUEST at {timestamp}")
+    logger.info(f"📨 Received question: {question}")
+    logger.info(f"📜 Conversation history length: {len(conversation_history)}")
+    logger.info(f"🔗 Client IP: {(scope.get('client') or ('?',))[0]}")
+
+    if not question:
+        logger.error("❌ No question provided in request")
+        await _send_plain(send, 400, "Error: Question is required.")
+        return
+
+    if not wants_event_stream(_header(scope, b"accept")):
+        await _send_json_answer(scope, send, question, conversation_history)
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+
+    # Stop generating (and release the API connection) when the client leaves
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    # Deltas are coalesced into larger frames (SSE_COALESCE_BYTES / _MS)
+    stream = acoalesce_tokens(_answer_stream(question, conversation_history))
+    try:
+        async for chunk in stream:
+            if disconnected.is_set():
+                logger.info("🔌 Client disconnected - stopping stream")
+                break
+            await send(
+                {"type": "http.response.body", "body": _sse({"token": chunk}), "more_body": True}
+            )
+    except Exception as e:
+        logger.error(f"❌ RAG streaming error: {str(e)}")
+        if not disconnected.is_set():
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": _sse({"error": f"RAG error: {str(e)}"}),
+                    "more_body": True,
+                }
+            )
+    finally:
+        await stream.aclose()
+        watcher.cancel()
+
+    if not disconnected.is_set():
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def ready(send):
+    """Readiness probe answered on the event loop, never queued behind Flask"""
+    status_code, payload = rag_readiness()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode("utf-8")})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Load the index in the background; /ready reports 503 until done
+            if not is_rag_ready():
+                threading.Thread(target=warm_up_rag, daemon=True).start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif (
+        scope["type"] == "http"
+        and scope["method"] == "POST"
+        and scope["path"] in ASK_PATHS
+    ):
+        await ask(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/ready":
+        await ready(send)
+    else:
+        await flask_application(scope, receive, send)
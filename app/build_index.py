@@ -0,0 +1,191 @@
+"""Build the RAG index ahead of time into a deployable artifact directory.
+
+Usage:
+    python -m app.build_index --data-dir data --output index
+
+Serving processes load the artifact read-only (see ``RAG_INDEX_DIR``) and
+never call the embeddings API for documents. Rebuilding into an existing
+artifact directory only embeds chunks whose text changed.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+try:
+    from .enhanced_rag_agent import (
+        EMBEDDING_MODEL,
+        chunk_documents,
+        calculate_content_hash,
+        make_text_splitter,
+    )
+    from .embedding_store import EmbeddingStore, chunk_cache_key
+    from .embedding_pipeline import EmbeddingPipeline
+    from .index_artifact import write_index_artifact
+    from .ann_index import load_or_build_ann_index
+    from .openai_client import get_openai_client
+    from .quantization import load_or_build_quantizer
+    from .lexical_index import load_or_build_lexical_index
+    from .entity_index import load_or_build_entity_index
+except ImportError:
+    from enhanced_rag_agent import (
+        EMBEDDING_MODEL,
+        chunk_documents,
+        calculate_content_hash,
+        make_text_splitter,
+    )
+    from embedding_store import EmbeddingStore, chunk_cache_key
+    from embedding_pipeline import EmbeddingPipeline
+    from index_artifact import write_index_artifact
+    from ann_index import load_or_build_ann_index
+    from openai_client import get_openai_client
+    from quantization import load_or_build_quantizer
+    from lexical_index import load_or_build_lexical_index
+    from entity_index import load_or_build_entity_index
+
+logger = logging.getLogger(__name__)
+
+
+def build_index(
+    data_dir: str,
+    output_dir: str,
+    chunk_size: int = 4000,
+    chunk_overlap: int = 150,
+    max_tokens: int = 800,
+    workers: int = 4,
+    batch_tokens: int = 100_000,
+    allow_partial: bool = False,
+) -> bool:
+    """Chunk, embed and write the artifact; return False if chunks are missing"""
+    if openai is None:
+        raise ImportError("OpenAI package is required but not installed")
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is required")
+
+    splitter = make_text_splitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, max_tokens=max_tokens
+    )
+    chunks = chunk_documents(data_dir, splitter)
+    keys = [chunk_cache_key(EMBEDDING_MODEL, chunk.content) for chunk in chunks]
+
+    # Reuse vectors from the previous build of this artifact
+    vectors_by_key = {}
+    previous = EmbeddingStore.load(output_dir)
+    if previous is not None and previous.model == EMBEDDING_MODEL:
+        for key, row in previous.rows_by_key().items():
+            vectors_by_key[key] = np.array(previous.vectors[row])
+
+    missing = [i for i, key in enumerate(keys) if key not in vectors_by_key]
+    logger.info(
+        f"🔄 {len(chunks) - len(missing)} chunks reused, {len(missing)} to embed"
+    )
+
+    pipeline = EmbeddingPipeline(
+        get_openai_client(),
+        EMBEDDING_MODEL,
+        max_workers=workers,
+        max_batch_tokens=batch_tokens,
+        checkpoint_dir=os.path.join(output_dir, ".checkpoints"),
+    )
+    if missing:
+        vectors_by_key.update(
+            pipeline.embed([keys[i] for i in missing], [chunks[i].content for i in missing])
+        )
+
+    embedded = [i for i, key in enumerate(keys) if key in vectors_by_key]
+    if len(embedded) < len(chunks) and not allow_partial:
+        logger.error(
+            f"❌ {len(chunks) - len(embedded)} chunks could not be embedded; rerun to resume"
+        )
+        return False
+
+    records = []
+    for i in embedded:
+        record = chunks[i].model_dump()
+        record["key"] = keys[i]
+        records.append(record)
+
+    content_hash = calculate_content_hash(
+        [chunks[i] for i in embedded], [keys[i] for i in embedded]
+    )
+
+    store = write_index_artifact(
+        output_dir,
+        records,
+        np.array([vectors_by_key[keys[i]] for i in embedded], dtype=np.float32),
+        model=EMBEDDING_MODEL,
+        content_hash=content_hash,
+        settings={
+            "data_dir": os.path.abspath(data_dir),
+            "chunker": type(splitter).__name__,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "max_tokens": max_tokens,
+        },
+    )
+    # Persist the ANN index and vector codes too (ANN_BACKEND, VECTOR_QUANTIZATION)
+    # so serving processes only load them; codes are skipped when ANN is used
+    ann = load_or_build_ann_index(store.vectors, store.version, directory=output_dir)
+    load_or_build_quantizer(
+        store.vectors, store.version, directory=output_dir, ann_active=ann is not None
+    )
+    # Likewise the BM25 postings and entity index, so no corpus scan at startup
+    contents = [record["content"] for record in records]
+    load_or_build_lexical_index(contents, store.version, directory=output_dir)
+    load_or_build_entity_index(contents, store.version, directory=output_dir)
+
+    pipeline.clear_checkpoints()
+    return True
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Build a deployable RAG index artifact")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "./data/"))
+    parser.add_argument("--output", default="index", help="Artifact directory")
+    parser.add_argument(
+        "--chunk-size", type=int, default=4000, help="Window size in characters (CHUNKER=window)"
+    )
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=int(os.getenv("CHUNK_MAX_TOKENS", "800")),
+        help="Token budget per chunk for the markdown chunker",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=100_000)
+    parser.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="Write the artifact even if some chunks failed to embed",
+    )
+    args = parser.parse_args(argv)
+
+    ok = build_index(
+        args.data_dir,
+        args.output,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        max_tokens=args.max_tokens,
+        workers=args.workers,
+        batch_tokens=args.batch_tokens,
+        allow_partial=args.allow_partial,
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import logging
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    from .tokens import count_tokens, CHARS_PER_TOKEN
+except ImportError:
+    from tokens import count_tokens, CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+
+def _new_text(first: str, second: str, overlap: int) -> str:
+    """What to append to first for second, without the text the two share"""
+    # Chunk texts are stripped, so the shared part is found by matching the
+    # longest suffix of first that starts second, up to the offset overlap
+    for size in range(min(overlap, len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return second[size:]
+    return f"\n{second}"
+
+
+def _label(text: str, heading_path: List[str]) -> str:
+    """Prefix text with its heading path unless it already opens with the heading"""
+    if not heading_path:
+        return text
+    first_line = text.lstrip().split("\n", 1)[0].strip("*# ")
+    if first_line.startswith(heading_path[-1]):
+        return text
+    # Where the text sits in the document, e.g. Chương II > Điều 12
+    return f"[{' > '.join(heading_path)}]\n{text}"
+
+
+def _select_within_budget(results: Sequence, max_tokens: int) -> List[Tuple[object, int]]:
+    """Best-scoring results whose texts fit in max_tokens, with their token counts"""
+    selected = []
+    used = 0
+    for result in sorted(results, key=lambda r: r.final_score, reverse=True):
+        tokens = count_tokens(result.chunk.content)
+        if used + tokens <= max_tokens:
+            selected.append((result, tokens))
+            used += tokens
+    if not selected and results:
+        # Even the best chunk alone is over budget: keep it, cut to fit
+        best = max(results, key=lambda r: r.final_score)
+        selected.append((best, max_tokens))
+    return selected
+
+
+def build_context(results: Sequence, max_tokens: int = 6000) -> str:
+    """Prompt context from retrieval results, packed into a token budget.
+
+    Results are taken by score until ``max_tokens`` is used up. Selected
+    chunks of the same file whose ``start_char``/``end_char`` ranges overlap
+    are merged into one span, so overlapping text is sent once; each heading
+    within a span keeps its own label. Documents are ordered by their best
+    score, spans by position.
+    """
+    selected = _select_within_budget(results, max_tokens)
+
+    by_file: Dict[str, List] = defaultdict(list)
+    for result, tokens in selected:
+        by_file[result.chunk.filename].append((result, tokens))
+
+    documents = []
+    span_count = 0
+    for filename, entries in by_file.items():
+        entries.sort(key=lambda entry: entry[0].chunk.start_char)
+
+        spans = []  # [start_char, end_char, [[text, heading_path], ...]]
+        for result, tokens in entries:
+            chunk = result.chunk
+            text = chunk.content
+            if tokens < count_tokens(text):
+                text = text[: int(tokens * CHARS_PER_TOKEN)]
+
+            if spans and chunk.start_char < spans[-1][1]:
+                last = spans[-1]
+                pieces = last[2]
+                text = _new_text(pieces[-1][0], text, last[1] - chunk.start_char)
+                last[1] = max(last[1], chunk.end_char)
+                if not text.strip():
+                    continue
+                if chunk.heading_path == pieces[-1][1]:
+                    pieces[-1][0] = f"{pieces[-1][0]}{text}"
+                else:
+                    pieces.append([text.lstrip(), chunk.heading_path])
+            else:
+                spans.append([chunk.start_char, chunk.end_char, [[text, chunk.heading_path]]])
+
+        parts = [
+            "\n".join(_label(text, heading_path) for text, heading_path in pieces)
+            for _, _, pieces in spans
+        ]
+
+        span_count += len(spans)
+        max_score = max(result.final_score for result, _ in entries)
+        documents.append((max_score, filename, "\n\n---\n\n".join(parts)))
+
+    documents.sort(key=lambda document: document[0], reverse=True)
+
+    context_parts = []
+    for max_score, filename, content in documents:
+        context_parts.append(f"**Document: {filename}** (Max Score: {max_score:.3f})")
+        context_parts.append(content)
+        context_parts.append("")  # Add spacing between documents
+
+    context = "\n".join(context_parts)
+    logger.info(
+        f"📦 Context: {len(selected)}/{len(results)} chunks → {span_count} spans, "
+        f"~{count_tokens(context)} tokens (budget {max_tokens})"
+    )
+    return context
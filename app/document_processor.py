@@ -1,33 +1,105 @@
 import os
-import io
+import time
+import random
 import logging
 import openai
-import base64
-from typing import Dict, List, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Any, NamedTuple, Optional
 import pdf2image
 from PIL import Image
 import docx
 import tempfile
 
+try:
+    from .openai_client import get_openai_client, is_retryable_error, retry_after_seconds
+    from .vision_image import encode_page_image, vision_image_settings
+    from .markdown_chunker import MarkdownChunker
+    from .tokens import count_tokens
+except ImportError:
+    from openai_client import get_openai_client, is_retryable_error, retry_after_seconds
+    from vision_image import encode_page_image, vision_image_settings
+    from markdown_chunker import MarkdownChunker
+    from tokens import count_tokens
+
 logger = logging.getLogger(__name__)
 
 
+class PdfPage(NamedTuple):
+    page_number: int
+    text: str
+    is_scanned: bool  # no usable text layer over a page-sized image: send to vision
+
+
+def _largest_image_coverage(page) -> float:
+    """Pixel area of the page's largest image XObject over the page area in points.
+
+    A scan embeds one image of at least the page size at 72 DPI (coverage
+    >= 1); logos and stamps are a small fraction of it. Form XObjects are
+    searched one level deep, which is where scanners sometimes wrap pages.
+    """
+    try:
+        box = page.mediabox
+        page_area = float(box.width) * float(box.height)
+        resources = page.get("/Resources") or {}
+        xobjects = list((resources.get_object().get("/XObject") or {}).get_object().values())
+    except Exception:
+        return 0.0
+    if page_area <= 0:
+        return 0.0
+
+    largest = 0
+    for depth in (0, 1):
+        forms = []
+        for xobject in xobjects:
+            xobject = xobject.get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                largest = max(largest, int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0)))
+            elif subtype == "/Form" and depth == 0:
+                nested = (xobject.get("/Resources") or {}).get_object().get("/XObject") or {}
+                forms.extend(nested.get_object().values())
+        xobjects = forms
+    return largest / page_area
+
+
+class TextSegment(NamedTuple):
+    text: str
+    heading_context: List[str]  # headings in force where the previous segment ended
+
+
 class DocumentProcessor:
     """Handles document processing and conversion to markdown"""
 
     def __init__(self):
         self.openai_client = None
+        # Scanned pages sent to the vision model at once, and retries per page
+        self.ocr_concurrency = max(1, int(os.getenv("OCR_CONCURRENCY", "4")))
+        self.ocr_max_retries = int(os.getenv("OCR_MAX_RETRIES", "3"))
+        # Scanned pages are rendered PDF_RASTER_WINDOW pages at a time
+        self.raster_dpi = int(os.getenv("PDF_RASTER_DPI", "150"))
+        self.raster_window = max(1, int(os.getenv("PDF_RASTER_WINDOW", "4")))
+        # Pages with fewer extractable characters than this are treated as scans
+        # when they also carry an image covering PDF_MIN_IMAGE_COVERAGE of the page
+        self.min_page_chars = int(os.getenv("PDF_MIN_PAGE_CHARS", "100"))
+        self.min_image_coverage = float(os.getenv("PDF_MIN_IMAGE_COVERAGE", "0.25"))
+        # Long texts are formatted in segments of this many tokens, in parallel
+        self.format_segment_tokens = int(os.getenv("FORMAT_SEGMENT_TOKENS", "1500"))
+        self.format_concurrency = max(1, int(os.getenv("FORMAT_CONCURRENCY", "4")))
+        # Crop/grayscale/downscale/encoding applied to pages (VISION_* settings)
+        self.vision_settings = vision_image_settings()
         self._init_openai()
 
     def _init_openai(self):
-        """Initialize OpenAI client"""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        """Use the shared, pooled OpenAI client"""
+        if not os.getenv("OPENAI_API_KEY"):
             logger.error("OPENAI_API_KEY not found")
             return
 
         try:
-            self.openai_client = openai.OpenAI(api_key=api_key)
+            # _with_retries owns retrying, so the SDK's retries are turned off
+            # (the copy shares the pooled connections)
+            self.openai_client = get_openai_client().with_options(max_retries=0)
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {e}")
 
@@ -70,72 +142,131 @@ class DocumentProcessor:
         except Exception as e:
             raise Exception(f"Failed to extract text from DOC: {e}")
 
-    def is_scanned_pdf(self, file_path: str) -> bool:
-        """Check if PDF is scanned (image-based) by trying to extract text"""
+    def analyze_pdf(self, file_path: str) -> Optional[List[PdfPage]]:
+        """Extract every page's text in one pass and classify each page.
+
+        A page is scanned when it has little extractable text and an image
+        large enough to hold a page; blank separator pages and short title
+        or signature pages without such an image keep their text.
+
+        Returns None when the PDF cannot be parsed at all; the whole document
+        then goes through vision.
+        """
         try:
             import PyPDF2
 
+            pages = []
             with open(file_path, "rb") as file:
                 reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages[:3]:  # Check first 3 pages
-                    text += page.extract_text()
-
-                # If extracted text is very short compared to expected content, likely scanned
-                return len(text.strip()) < 100
-        except Exception:
-            # If we can't extract text, assume it's scanned
-            return True
-
-    def convert_pdf_to_images(self, file_path: str) -> List[Image.Image]:
-        """Convert PDF pages to images"""
-        try:
-            images = pdf2image.convert_from_path(file_path)
-            return images
+                for page_number, page in enumerate(reader.pages, start=1):
+                    try:
+                        text = page.extract_text() or ""
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not extract text from page {page_number}: {e}")
+                        text = ""
+                    is_scanned = (
+                        len(text.strip()) < self.min_page_chars
+                        and _largest_image_coverage(page) >= self.min_image_coverage
+                    )
+                    pages.append(PdfPage(page_number, text, is_scanned))
+            return pages
         except Exception as e:
-            raise Exception(f"Failed to convert PDF to images: {e}")
+            logger.warning(f"⚠️ Could not parse PDF text, treating it as scanned: {e}")
+            return None
 
-    def image_to_base64(self, image: Image.Image) -> str:
-        """Convert PIL Image to base64 string"""
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        image_data = buffer.getvalue()
-        return base64.b64encode(image_data).decode("utf-8")
+    def get_pdf_page_count(self, file_path: str) -> int:
+        """Number of pages, read from the PDF info without rendering anything"""
+        try:
+            return int(pdf2image.pdfinfo_from_path(file_path)["Pages"])
+        except Exception as e:
+            raise Exception(f"Failed to read PDF info: {e}")
+
+    def _raster_windows(self, page_numbers: List[int]) -> Iterator[tuple]:
+        """(first_page, last_page) runs of consecutive pages, at most raster_window long"""
+        first_page = last_page = None
+        for page_number in page_numbers:
+            if (
+                first_page is not None
+                and page_number == last_page + 1
+                and page_number - first_page < self.raster_window
+            ):
+                last_page = page_number
+                continue
+            if first_page is not None:
+                yield first_page, last_page
+            first_page = last_page = page_number
+        if first_page is not None:
+            yield first_page, last_page
+
+    def iter_pdf_page_images(
+        self,
+        file_path: str,
+        page_count: Optional[int] = None,
+        page_numbers: Optional[List[int]] = None,
+    ) -> Iterator[Image.Image]:
+        """Render PDF pages lazily, ``raster_window`` pages per poppler call.
+
+        Only the current window is held here; each image is handed over as it
+        is yielded, so peak memory follows the window size, not the page count.
+        ``page_numbers`` (1-based, ascending) limits rendering to those pages.
+        """
+        if page_numbers is None:
+            if page_count is None:
+                page_count = self.get_pdf_page_count(file_path)
+            page_numbers = range(1, page_count + 1)
+
+        for first_page, last_page in self._raster_windows(page_numbers):
+            try:
+                images = pdf2image.convert_from_path(
+                    file_path,
+                    dpi=self.raster_dpi,
+                    first_page=first_page,
+                    last_page=last_page,
+                )
+            except Exception as e:
+                raise Exception(
+                    f"Failed to convert PDF pages {first_page}-{last_page} to images: {e}"
+                )
+            images.reverse()
+            while images:
+                yield images.pop()
 
-    def convert_image_to_markdown_with_gpt_vision(self, image: Image.Image) -> str:
-        """Convert image to markdown using GPT-4 Vision (gpt-5-mini equivalent)"""
+    def convert_image_url_to_markdown_with_gpt_vision(self, image_url: str) -> str:
+        """Convert an encoded page image to markdown with the vision model"""
         if not self.openai_client:
             raise Exception("OpenAI client not initialized")
 
         try:
-            # Convert image to base64
-            image_b64 = self.image_to_base64(image)
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-5-mini",  # Using gpt-4o-mini as gpt-5-mini equivalent
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert document digitizer. Convert the image of a document page to clean, well-structured markdown format. Preserve the document structure, headings, lists, tables, and formatting. Extract all text accurately and maintain the original layout as much as possible in markdown format.",
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Convert this document page image to markdown format. Maintain structure and formatting.",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_b64}"
-                                },
+            messages = [
+                {
+                    "role": "system",
+                    "content": "You are an expert document digitizer. Convert the image of a document page to clean, well-structured markdown format. Preserve the document structure, headings, lists, tables, and formatting. Extract all text accurately and maintain the original layout as much as possible in markdown format.",
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Convert this document page image to markdown format. Maintain structure and formatting.",
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url,
+                                "detail": self.vision_settings.detail,
                             },
-                        ],
-                    },
-                ],
-                max_tokens=4000,
-                temperature=0,
+                        },
+                    ],
+                },
+            ]
+
+            response = self._with_retries(
+                lambda: self.openai_client.chat.completions.create(
+                    model="gpt-5-mini",  # Using gpt-4o-mini as gpt-5-mini equivalent
+                    messages=messages,
+                    max_tokens=4000,
+                    temperature=0,
+                )
             )
 
             return response.choices[0].message.content
@@ -143,51 +274,262 @@ class DocumentProcessor:
         except Exception as e:
             raise Exception(f"GPT Vision conversion failed: {e}")
 
+    def _with_retries(self, call: Callable, max_retries: int = None):
+        """Run an API call, backing off and retrying on transient failures"""
+        max_retries = self.ocr_max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable_error(e):
+                    raise
+
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(30.0, 2.0**attempt) * random.uniform(0.5, 1.0)
+                logger.warning(
+                    f"⏳ OpenAI call retry {attempt + 1}/{max_retries} in {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+
+    def convert_pages_to_markdown(
+        self,
+        images: Iterable[Image.Image],
+        total: Optional[int] = None,
+        page_numbers: Optional[List[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Convert page images with up to ``ocr_concurrency`` vision calls in flight.
+
+        ``images`` may be a lazy iterator: pages are pulled only as workers
+        free up, and each image is closed once encoded, so at most a couple of
+        pages per worker are decoded at a time. Results keep page order
+        regardless of which call finishes first. A page that still fails
+        after its retries fails the whole document. ``page_numbers`` labels
+        the images when they are not pages 1..n.
+        """
+        if total is None and hasattr(images, "__len__"):
+            total = len(images)
+
+        def convert(index, page_number, image):
+            started = time.time()
+            try:
+                encoded = encode_page_image(image, self.vision_settings)
+            finally:
+                # Release the pixels before the (slow) API round-trip
+                image.close()
+            markdown = self.convert_image_url_to_markdown_with_gpt_vision(encoded.data_url)
+            logger.info(
+                f"📄 Page {page_number} ({index}/{total or '?'}) converted in {time.time() - started:.1f}s "
+                f"({encoded.width}x{encoded.height}, {encoded.size_bytes / 1024:.0f} KB)"
+            )
+            return {"page_number": page_number, "markdown": markdown}
+
+        workers = min(self.ocr_concurrency, total or self.ocr_concurrency) or 1
+        page_markdowns = []
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for index, image in enumerate(images, start=1):
+                    page_number = page_numbers[index - 1] if page_numbers else index
+                    pending.append(executor.submit(convert, index, page_number, image))
+                    del image
+                    # Keep one queued page per worker; wait on the oldest page
+                    # so results are collected in page order
+                    if len(pending) >= 2 * workers:
+                        page_markdowns.append(pending.popleft().result())
+                while pending:
+                    page_markdowns.append(pending.popleft().result())
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+        return page_markdowns
+
+    def split_text_for_formatting(self, text: str) -> List[TextSegment]:
+        """Cut text into segments of at most ``format_segment_tokens`` tokens.
+
+        Boundaries come from MarkdownChunker (headings, Chương/Mục/Điều,
+        paragraphs, khoản/điểm); consecutive sections are packed together so
+        short articles do not each cost a request. Segment text is sliced
+        from the original, so nothing between sections is lost.
+        """
+        segments = []
+        start = end = None
+        tokens = 0
+        heading_context: List[str] = []
+        last_path: List[str] = []
+
+        chunker = MarkdownChunker(max_tokens=self.format_segment_tokens)
+        for section in chunker.split_text(text):
+            section_tokens = count_tokens(section.content)
+            if start is not None and tokens + section_tokens > self.format_segment_tokens:
+                segments.append(TextSegment(text[start:end], heading_context))
+                heading_context = last_path
+                start = None
+            if start is None:
+                start, tokens = section.start_char, 0
+            end = section.end_char
+            tokens += section_tokens
+            last_path = section.heading_path
+
+        if start is not None:
+            segments.append(TextSegment(text[start:end], heading_context))
+        return segments
+
     def convert_text_to_markdown_with_gpt(self, text: str) -> str:
-        """Convert text to structured markdown using GPT-4"""
+        """Convert text to structured markdown using GPT-4.
+
+        Texts longer than one segment are split on article/paragraph
+        boundaries, formatted ``format_concurrency`` segments at a time and
+        joined in order, so long laws are neither truncated by the output
+        limit nor bound by one slow request.
+        """
         if not self.openai_client:
             raise Exception("OpenAI client not initialized")
 
+        segments = self.split_text_for_formatting(text)
+        if len(segments) <= 1:
+            return self._format_segment(text, [], 1, 1)
+
+        total = len(segments)
+        logger.info(
+            f"Formatting {total} segments, {self.format_concurrency} at a time"
+        )
+
+        def format_segment(numbered):
+            index, segment = numbered
+            return self._format_segment(segment.text, segment.heading_context, index, total)
+
+        with ThreadPoolExecutor(max_workers=min(self.format_concurrency, total)) as executor:
+            # map() yields in submission order, i.e. document order
+            return "\n\n".join(executor.map(format_segment, enumerate(segments, start=1)))
+
+    def _format_segment(
+        self, text: str, heading_context: List[str], index: int, total: int
+    ) -> str:
+        """Format one segment; part-of-document instructions when total > 1"""
+        system_prompt = "You are an expert document formatter. Convert the given text to clean, well-structured markdown format. Create appropriate headings, lists, tables, and formatting. Improve readability while preserving all information and meaning."
+        if total > 1:
+            system_prompt += f" The text is part {index} of {total} of a longer document: format only this part, keep every sentence, and do not add titles, summaries or closing remarks."
+            if heading_context:
+                system_prompt += f" The previous part ended inside: {' > '.join(heading_context)}. Keep heading levels consistent with that and do not repeat those headings."
+
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-5-nano",  # Using gpt-4o-mini as gpt-5-nano equivalent
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert document formatter. Convert the given text to clean, well-structured markdown format. Create appropriate headings, lists, tables, and formatting. Improve readability while preserving all information and meaning.",
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Convert this text to well-structured markdown format:\n\n{text}",
-                    },
-                ],
-                max_tokens=4000,
-                temperature=0,
+            response = self._with_retries(
+                lambda: self.openai_client.chat.completions.create(
+                    model="gpt-5-nano",  # Using gpt-4o-mini as gpt-5-nano equivalent
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {
+                            "role": "user",
+                            "content": f"Convert this text to well-structured markdown format:\n\n{text}",
+                        },
+                    ],
+                    max_tokens=4000,
+                    temperature=0,
+                )
             )
 
-            return response.choices[0].message.content
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                logger.warning(
+                    f"⚠️ Formatted segment {index}/{total} hit the output limit; "
+                    f"lower FORMAT_SEGMENT_TOKENS"
+                )
+            return choice.message.content
 
         except Exception as e:
             raise Exception(f"GPT text conversion failed: {e}")
 
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
-        try:
-            import PyPDF2
+        pages = self.analyze_pdf(file_path)
+        if pages is None:
+            raise Exception("Failed to extract text from PDF")
+        return "\n".join(page.text for page in pages)
+
+    def convert_pdf_to_markdown(self, file_path: str) -> Dict[str, Any]:
+        """Markdown for a PDF, routing each page by its text density.
+
+        Runs of text pages are extracted locally and formatted together; only
+        pages without a usable text layer are rendered and sent to vision.
+        Returns the ``process_document`` result fields.
+        """
+        pages = self.analyze_pdf(file_path)
+        if pages is None:
+            page_count = self.get_pdf_page_count(file_path)
+            pages = [PdfPage(n, "", True) for n in range(1, page_count + 1)]
+
+        scanned = [page.page_number for page in pages if page.is_scanned]
+        logger.info(
+            f"PDF analysis: {len(pages) - len(scanned)} text pages, {len(scanned)} scanned pages"
+        )
+
+        if not scanned:
+            logger.info("Processing text-based PDF")
+            text = "\n".join(page.text for page in pages)
+            return {
+                "markdown_content": self.convert_text_to_markdown_with_gpt(text),
+                "processing_method": "text_pdf_gpt_formatting",
+            }
+
+        logger.info(
+            f"Converting {len(scanned)} scanned pages at {self.raster_dpi} DPI, "
+            f"{self.ocr_concurrency} at a time"
+        )
+        page_markdowns = self.convert_pages_to_markdown(
+            self.iter_pdf_page_images(file_path, page_numbers=scanned),
+            len(scanned),
+            page_numbers=scanned,
+        )
+
+        if len(scanned) == len(pages):
+            return {
+                "markdown_content": "\n\n---\n\n".join(p["markdown"] for p in page_markdowns),
+                "processing_method": "scanned_pdf_gpt_vision",
+                "pages": page_markdowns,
+            }
+
+        # Mixed PDF: stitch vision pages and formatted text runs in page order
+        vision_markdown = {p["page_number"]: p["markdown"] for p in page_markdowns}
+        parts = []
+        text_run = []
+
+        def flush_text_run():
+            text = "\n".join(text_run)
+            if text.strip():  # blank separator pages need no formatting call
+                parts.append(self.convert_text_to_markdown_with_gpt(text))
+            text_run.clear()
+
+        for page in pages:
+            if not page.is_scanned:
+                text_run.append(page.text)
+                continue
+            flush_text_run()
+            parts.append(vision_markdown[page.page_number])
+        flush_text_run()
+
+        return {
+            "markdown_content": "\n\n---\n\n".join(parts),
+            "processing_method": "mixed_pdf_text_and_gpt_vision",
+            "pages": page_markdowns,
+        }
 
-            with open(file_path, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
-        except Exception as e:
-            raise Exception(f"Failed to extract text from PDF: {e}")
+
+_processor = None
+
+
+def get_document_processor() -> DocumentProcessor:
+    """Processor shared by all uploads in this process"""
+    global _processor
+    if _processor is None or _processor.openai_client is None:
+        _processor = DocumentProcessor()
+    return _processor
 
 
 def process_document(file_path: str, filename: str) -> Dict[str, Any]:
     """Main function to process document and convert to markdown"""
-    processor = DocumentProcessor()
+    processor = get_document_processor()
 
     try:
         # Get file extension
@@ -242,49 +584,8 @@ def process_document(file_path: str, filename: str) -> Dict[str, Any]:
             )
 
         elif file_extension == "pdf":
-            # Check if PDF is scanned
-            if processor.is_scanned_pdf(file_path):
-                # Process as scanned PDF using vision
-                logger.info("Processing scanned PDF with GPT Vision")
-                images = processor.convert_pdf_to_images(file_path)
-
-                page_markdowns = []
-                for i, image in enumerate(images):
-                    logger.info(f"Processing page {i+1}/{len(images)}")
-                    page_markdown = processor.convert_image_to_markdown_with_gpt_vision(
-                        image
-                    )
-                    page_markdowns.append(
-                        {"page_number": i + 1, "markdown": page_markdown}
-                    )
-
-                # Combine all pages
-                full_markdown = "\n\n---\n\n".join(
-                    [p["markdown"] for p in page_markdowns]
-                )
-
-                result.update(
-                    {
-                        "success": True,
-                        "markdown_content": full_markdown,
-                        "processing_method": "scanned_pdf_gpt_vision",
-                        "pages": page_markdowns,
-                    }
-                )
-
-            else:
-                # Process as text-based PDF
-                logger.info("Processing text-based PDF")
-                text = processor.extract_text_from_pdf(file_path)
-                markdown_content = processor.convert_text_to_markdown_with_gpt(text)
-
-                result.update(
-                    {
-                        "success": True,
-                        "markdown_content": markdown_content,
-                        "processing_method": "text_pdf_gpt_formatting",
-                    }
-                )
+            result.update(processor.convert_pdf_to_markdown(file_path))
+            result["success"] = True
 
         else:
             raise Exception(f"Unsupported file type: {file_extension}")
@@ -0,0 +1,199 @@
+import os
+import time
+import random
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .tokens import count_tokens, EMBEDDING_ENCODING
+    from .openai_client import is_retryable_error, retry_after_seconds
+except ImportError:
+    from tokens import count_tokens, EMBEDDING_ENCODING
+    from openai_client import is_retryable_error, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# OpenAI rejects single inputs above 8191 tokens and requests above 2048 inputs
+MAX_INPUT_TOKENS = 8191
+MAX_BATCH_INPUTS = 2048
+
+
+class EmbeddingError(Exception):
+    """Raised when a batch cannot be embedded after all retries"""
+
+
+class EmbeddingPipeline:
+    """Embeds many texts with concurrent, token-sized, retrying batches.
+
+    Texts are identified by caller-supplied keys (the chunk cache keys). Each
+    finished batch is checkpointed to disk when a checkpoint directory is
+    given, so an interrupted build resumes where it stopped. Failed texts are
+    reported back instead of being filled with placeholder vectors.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        max_workers: int = 4,
+        max_batch_tokens: int = 100_000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.max_workers = max(1, max_workers)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint_dir = checkpoint_dir
+
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _make_batches(self, items: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """Group (key, text) items into batches bounded by token count"""
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for key, text in items:
+            tokens = min(count_tokens(text, EMBEDDING_ENCODING), MAX_INPUT_TOKENS)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= MAX_BATCH_INPUTS
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append((key, text))
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[Tuple[str, str]]) -> np.ndarray:
+        """Embed one batch, backing off and retrying on transient failures"""
+        texts = [text for _, text in batch]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Retries happen here, so the SDK's own retries are turned off
+                response = self.client.with_options(max_retries=0).embeddings.create(
+                    model=self.model, input=texts
+                )
+                vectors = np.array(
+                    [item.embedding for item in response.data], dtype=np.float32
+                )
+                if vectors.shape[0] != len(texts) or not np.all(
+                    np.linalg.norm(vectors, axis=1) > 0
+                ):
+                    raise EmbeddingError("Embedding response is incomplete")
+                return vectors
+
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise EmbeddingError(f"Embedding batch failed: {e}") from e
+
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2**attempt))
+                    delay *= random.uniform(0.5, 1.0)
+                logger.warning(
+                    f"⏳ Embedding batch retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+
+    def _checkpoint_path(self, batch: List[Tuple[str, str]]) -> str:
+        digest = hashlib.sha256("\n".join(key for key, _ in batch).encode()).hexdigest()
+        return os.path.join(self.checkpoint_dir, f"batch-{digest[:16]}.npz")
+
+    def _save_checkpoint(self, batch: List[Tuple[str, str]], vectors: np.ndarray):
+        path = self._checkpoint_path(batch)
+        tmp_path = f"{path}.tmp.npz"
+        try:
+            np.savez(tmp_path, keys=np.array([key for key, _ in batch]), vectors=vectors)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write embedding checkpoint: {e}")
+
+    def _load_checkpoints(self) -> Dict[str, np.ndarray]:
+        """Vectors already embedded by an earlier, interrupted run"""
+        done = {}
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return done
+
+        for name in os.listdir(self.checkpoint_dir):
+            if not (name.startswith("batch-") and name.endswith(".npz")) or ".tmp" in name:
+                continue
+            try:
+                with np.load(os.path.join(self.checkpoint_dir, name)) as data:
+                    for key, vector in zip(data["keys"], data["vectors"]):
+                        done[str(key)] = vector
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping unreadable checkpoint {name}: {e}")
+        return done
+
+    def clear_checkpoints(self):
+        """Remove checkpoint files once their vectors are in the embedding store"""
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return
+        for name in os.listdir(self.checkpoint_dir):
+            if name.startswith("batch-"):
+                try:
+                    os.remove(os.path.join(self.checkpoint_dir, name))
+                except OSError:
+                    pass
+
+    def embed(self, keys: List[str], texts: List[str]) -> Dict[str, np.ndarray]:
+        """Embed texts, returning vectors by key for every text that succeeded"""
+        results = {}
+        checkpointed = self._load_checkpoints()
+
+        pending = []
+        for key, text in zip(keys, texts):
+            if key in checkpointed:
+                results[key] = checkpointed[key]
+            elif key not in results:
+                pending.append((key, text))
+                results[key] = None
+
+        if checkpointed:
+            logger.info(f"♻️ Resumed {len(keys) - len(pending)} embeddings from checkpoint")
+
+        batches = self._make_batches(pending)
+        if batches:
+            logger.info(
+                f"🧠 Embedding {len(pending)} texts in {len(batches)} batches with {self.max_workers} workers"
+            )
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._embed_batch, batch): batch for batch in batches}
+            for completed, future in enumerate(as_completed(futures), start=1):
+                batch = futures[future]
+                try:
+                    vectors = future.result()
+                except EmbeddingError as e:
+                    failed += len(batch)
+                    logger.error(f"❌ {e}")
+                    continue
+
+                for (key, _), vector in zip(batch, vectors):
+                    results[key] = vector
+                if self.checkpoint_dir:
+                    self._save_checkpoint(batch, vectors)
+                logger.info(f"📡 Embedded batch {completed}/{len(batches)}")
+
+        if failed:
+            logger.error(f"❌ {failed} texts could not be embedded and were skipped")
+
+        return {key: vector for key, vector in results.items() if vector is not None}
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+try:
+    from .vector_index import normalize_rows
+except ImportError:
+    from vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes so old stores are rebuilt, not misread
+STORE_FORMAT_VERSION = 2
+MANIFEST_FILENAME = "manifest.json"
+
+
+def chunk_cache_key(model: str, text: str) -> str:
+    """Content address of one chunk embedding: the model plus a SHA-256 of the text"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingStore:
+    """Versioned on-disk embedding store shared by all worker processes.
+
+    Layout of a store directory:
+        manifest.json          - format version, model, dimension, chunk metadata
+                                 (including each chunk's content-addressed key)
+        vectors-<version>.f32  - raw row-major float32 matrix, rows pre-normalized
+
+    The vectors file is opened with ``np.memmap`` in read-only mode, so every
+    worker maps the same pages from the OS page cache instead of holding its
+    own copy of the embeddings.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any], vectors: np.ndarray):
+        self.directory = directory
+        self.manifest = manifest
+        self.vectors = vectors
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def model(self) -> str:
+        return self.manifest["model"]
+
+    @property
+    def dim(self) -> int:
+        return self.manifest["dim"]
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    @property
+    def content_hash(self) -> Optional[str]:
+        return self.manifest.get("content_hash")
+
+    @property
+    def chunks(self) -> List[Dict[str, Any]]:
+        return self.manifest.get("chunks", [])
+
+    def rows_by_key(self) -> Dict[str, int]:
+        """Map each chunk cache key to its row in the vectors matrix"""
+        return {
+            chunk["key"]: row
+            for row, chunk in enumerate(self.chunks)
+            if chunk.get("key")
+        }
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["EmbeddingStore"]:
+        """Memory-map an existing store, or return None if there is none"""
+        manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return None
+
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+            if manifest.get("format_version") != STORE_FORMAT_VERSION:
+                logger.info(
+                    f"⚠️ Embedding store format {manifest.get('format_version')} is outdated"
+                )
+                return None
+
+            vectors_path = os.path.join(directory, manifest["vectors_file"])
+            count, dim = manifest["count"], manifest["dim"]
+            if count == 0:
+                vectors = np.zeros((0, dim), dtype=np.float32)
+            else:
+                vectors = np.memmap(
+                    vectors_path, dtype=np.float32, mode="r", shape=(count, dim)
+                )
+
+            logger.info(
+                f"🗺️ Memory-mapped embedding store {manifest['version']} ({count}×{dim})"
+            )
+            return cls(directory, manifest, vectors)
+
+        except Exception as e:
+            logger.warning(f"⚠️ Error loading embedding store: {e}")
+            return None
+
+    @classmethod
+    def save(
+        cls,
+        directory: str,
+        vectors,
+        model: str,
+        chunks: List[Dict[str, Any]],
+        content_hash: Optional[str] = None,
+    ) -> "EmbeddingStore":
+        """Write a new store version atomically and return it memory-mapped"""
+        os.makedirs(directory, exist_ok=True)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        matrix = normalize_rows(matrix)
+        count, dim = matrix.shape
+
+        version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        if content_hash:
+            version = f"{version}-{content_hash[:8]}"
+        vectors_file = f"vectors-{version}.f32"
+
+        vectors_tmp = os.path.join(directory, f".{vectors_file}.tmp")
+        matrix.tofile(vectors_tmp)
+        os.replace(vectors_tmp, os.path.join(directory, vectors_file))
+
+        manifest = {
+            "format_version": STORE_FORMAT_VERSION,
+            "version": version,
+            "created_at": datetime.now().isoformat(),
+            "model": model,
+            "dim": int(dim),
+            "count": int(count),
+            "dtype": "float32",
+            "vectors_file": vectors_file,
+            "content_hash": content_hash,
+            "chunks": chunks,
+        }
+
+        manifest_tmp = os.path.join(directory, f".{MANIFEST_FILENAME}.tmp")
+        with open(manifest_tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        # The manifest swap is what publishes the new version to readers
+        os.replace(manifest_tmp, os.path.join(directory, MANIFEST_FILENAME))
+
+        cls._remove_stale_vectors(directory, keep=vectors_file)
+        logger.info(f"💾 Saved embedding store {version} ({count}×{dim})")
+
+        return cls.load(directory)
+
+    @staticmethod
+    def _remove_stale_vectors(directory: str, keep: str):
+        """Delete vector files from previous versions"""
+        for name in os.listdir(directory):
+            if name.startswith("vectors-") and name.endswith(".f32") and name != keep:
+                try:
+                    # Workers still mapping the old file keep their pages until exit
+                    os.remove(os.path.join(directory, name))
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not remove stale vectors {name}: {e}")
@@ -1,10 +1,13 @@
 import os
 import json
 import logging
-import pickle
 import hashlib
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 import numpy as np
 
 try:
@@ -25,10 +28,66 @@ try:
 except ImportError:
     openai = None
 
+try:
+    from .vector_index import VectorIndex
+    from .ann_index import load_or_build_ann_index
+    from .openai_client import (
+        get_openai_client,
+        get_async_openai_client,
+        reset_openai_clients,
+    )
+    from .quantization import load_or_build_quantizer
+    from .embedding_store import EmbeddingStore, chunk_cache_key
+    from .embedding_pipeline import EmbeddingPipeline
+    from .index_artifact import ARTIFACT_FILENAME, load_index_artifact
+    from .query_cache import QueryEmbeddingCache
+    from .answer_cache import SemanticAnswerCache
+    from .relevance_gate import RelevanceGate
+    from .lexical_index import BM25Index, load_or_build_lexical_index, reciprocal_rank_fusion
+    from .markdown_chunker import MarkdownChunker
+    from .context_builder import build_context
+    from .entity_index import (
+        EntityIndex,
+        extract_entities,
+        load_or_build_entity_index,
+        HAS_TABLE,
+        HAS_CONTACT_INFO,
+        HAS_ORGANIZATIONAL_INFO,
+    )
+except ImportError:
+    from vector_index import VectorIndex
+    from ann_index import load_or_build_ann_index
+    from openai_client import (
+        get_openai_client,
+        get_async_openai_client,
+        reset_openai_clients,
+    )
+    from quantization import load_or_build_quantizer
+    from embedding_store import EmbeddingStore, chunk_cache_key
+    from embedding_pipeline import EmbeddingPipeline
+    from index_artifact import ARTIFACT_FILENAME, load_index_artifact
+    from query_cache import QueryEmbeddingCache
+    from answer_cache import SemanticAnswerCache
+    from relevance_gate import RelevanceGate
+    from lexical_index import BM25Index, load_or_build_lexical_index, reciprocal_rank_fusion
+    from markdown_chunker import MarkdownChunker
+    from context_builder import build_context
+    from entity_index import (
+        EntityIndex,
+        extract_entities,
+        load_or_build_entity_index,
+        HAS_TABLE,
+        HAS_CONTACT_INFO,
+        HAS_ORGANIZATIONAL_INFO,
+    )
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+
 
 class DocumentChunk(BaseModel):
     """Model for document chunks with metadata"""
@@ -40,8 +99,9 @@ class DocumentChunk(BaseModel):
         description="Starting character position in original document"
     )
     end_char: int = Field(description="Ending character position in original document")
-    embedding: Optional[List[float]] = Field(
-        default=None, description="OpenAI embedding vector"
+    heading_path: List[str] = Field(
+        default_factory=list,
+        description="Markdown / legal headings (Chương, Mục, Điều) enclosing the chunk",
     )
 
 
@@ -49,11 +109,20 @@ class RetrievalResult(BaseModel):
     """Model for retrieval results with scores"""
 
     chunk: DocumentChunk
+    chunk_index: int = Field(default=-1, description="Position of the chunk in the index")
     similarity_score: float = Field(description="Cosine similarity score")
     rerank_score: float = Field(description="Re-ranking score")
     final_score: float = Field(description="Final combined score")
 
 
+class PreparedResponse(NamedTuple):
+    """Outcome of a request before generation: a cached answer or a prompt"""
+
+    messages: Optional[List[Dict[str, str]]] = None
+    on_complete: Optional[Callable[[str], None]] = None
+    cached_answer: Optional[str] = None
+
+
 class RelevanceCheck(BaseModel):
     """Model for relevance checking response"""
 
@@ -62,6 +131,9 @@ class RelevanceCheck(BaseModel):
     )
     confidence: float = Field(description="Confidence score between 0 and 1")
     reasoning: str = Field(description="Brief explanation of the relevance decision")
+    source: str = Field(
+        default="llm", description="Who decided: 'local' gate or 'llm' fallback"
+    )
 
 
 class TextSplitter:
@@ -103,6 +175,58 @@ class TextSplitter:
         return chunks
 
 
+def make_text_splitter(
+    chunk_size: int = 4000, chunk_overlap: int = 150, max_tokens: int = 800
+) -> Union[MarkdownChunker, TextSplitter]:
+    """Chunker selected by CHUNKER: 'markdown' (default) or 'window'"""
+    if os.getenv("CHUNKER", "markdown").lower() == "window":
+        return TextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return MarkdownChunker(max_tokens=max_tokens)
+
+
+def chunk_documents(
+    data_path: str, text_splitter: Union[MarkdownChunker, TextSplitter]
+) -> List[DocumentChunk]:
+    """Read every .md file in data_path and split it into chunks"""
+    all_chunks = []
+
+    # Sorted so chunk order, and with it the corpus hash, is stable across machines
+    md_files = sorted(f for f in os.listdir(data_path) if f.endswith(".md"))
+    logger.info(f"📄 Found {len(md_files)} .md files")
+
+    for filename in md_files:
+        file_path = os.path.join(data_path, filename)
+        try:
+            if isinstance(text_splitter, MarkdownChunker):
+                # Streams the file line by line instead of reading it whole
+                chunks = [
+                    DocumentChunk(filename=filename, chunk_id=chunk_id, **section._asdict())
+                    for chunk_id, section in enumerate(text_splitter.split_file(file_path))
+                ]
+            else:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                chunks = text_splitter.split_text(content, filename)
+            all_chunks.extend(chunks)
+
+            size = chunks[-1].end_char if chunks else 0
+            logger.info(f"📖 Processed {filename}: {size} chars → {len(chunks)} chunks")
+
+        except Exception as e:
+            logger.error(f"❌ Error reading {filename}: {e}")
+
+    logger.info(f"✅ Total chunks created: {len(all_chunks)}")
+    return all_chunks
+
+
+def calculate_content_hash(chunks: List[DocumentChunk], chunk_keys: List[str]) -> str:
+    """Hash identifying a corpus version from its chunk cache keys"""
+    content_str = "\n".join(
+        f"{chunk.filename}:{key}" for chunk, key in zip(chunks, chunk_keys)
+    )
+    return hashlib.md5(content_str.encode()).hexdigest()
+
+
 class EnhancedRAGAgent:
     def __init__(
         self, chunk_size: int = 4000, chunk_overlap: int = 150, top_k: int = 5
@@ -120,25 +244,92 @@ class EnhancedRAGAgent:
             logger.error("❌ OPENAI_API_KEY not found in environment variables")
             raise ValueError("OPENAI_API_KEY is required")
 
-        # Initialize OpenAI client
-        self.client = openai.OpenAI(api_key=api_key)
+        # Shared, pooled OpenAI client (see openai_client)
+        self.client = get_openai_client()
         logger.info("✅ OpenAI client initialized successfully")
 
         # Initialize text splitter
-        self.text_splitter = TextSplitter(
-            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        self.text_splitter = make_text_splitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "800")),
         )
         self.top_k = top_k
+        self.context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+
+        # Runs whole _prepare_response calls for the async path; separate from
+        # the pipeline pool, whose tasks they wait on, and sized for concurrent
+        # requests rather than the default executor's few threads per CPU
+        prepare_workers = int(os.getenv("RAG_PREPARE_WORKERS", "16"))
+        self._prepare_executor = ThreadPoolExecutor(
+            max_workers=prepare_workers, thread_name_prefix="rag-prepare"
+        )
+        # Runs the per-request network calls (embedding, relevance, retrieval)
+        # side by side, up to four per prepared request
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_PIPELINE_WORKERS", str(4 * prepare_workers))),
+            thread_name_prefix="rag-pipeline",
+        )
 
-        # Load and process documents
-        self.rules_content = self._load_rules()
-        self.document_chunks = self._load_and_chunk_documents()
+        # Near-identical questions without history replay a previous answer
+        self.answer_cache = SemanticAnswerCache(
+            dim=EMBEDDING_DIM,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600))),
+        )
+
+        # Most relevance decisions come from retrieval scores, not an LLM call.
+        # RELEVANCE_GATE=llm restores the LLM-only check.
+        self.relevance_gate = None
+        if os.getenv("RELEVANCE_GATE", "local").lower() != "llm":
+            self.relevance_gate = RelevanceGate(
+                relevant_threshold=float(os.getenv("RELEVANCE_HIGH", "0.45")),
+                irrelevant_threshold=float(os.getenv("RELEVANCE_LOW", "0.25")),
+                model_path=os.getenv("RELEVANCE_MODEL_PATH") or None,
+            )
+        # Start the LLM check next to the embedding, so an unsure gate does not
+        # add a second round-trip; costs an LLM call per question.
+        # RELEVANCE_SPECULATE=false only calls the LLM once the gate is unsure
+        self.speculative_relevance = (
+            self.relevance_gate is not None
+            and os.getenv("RELEVANCE_SPECULATE", "true").lower() == "true"
+        )
+
+        # Repeated questions reuse their embedding instead of calling the API
+        self.query_cache = QueryEmbeddingCache(
+            max_size=int(os.getenv("QUERY_CACHE_SIZE", "2048")),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", str(24 * 3600))),
+            sqlite_path=os.getenv("QUERY_CACHE_DB") or None,
+        )
 
-        # Initialize or load embeddings
-        self._initialize_embeddings()
+        self.rules_content = self._load_rules()
+        self.embedding_store: Optional[EmbeddingStore] = None
+        self.embedding_matrix: Optional[np.ndarray] = None
+        self.embedding_ids: Optional[np.ndarray] = None
+        self.vector_index: Optional[VectorIndex] = None
+        self.index_version: Optional[str] = None
+        self.lexical_index: Optional[BM25Index] = None
+        self.entity_index: Optional[EntityIndex] = None
+
+        # Prefer a prebuilt index artifact; otherwise chunk and embed on startup
+        artifact_dir = self._get_artifact_dir()
+        if artifact_dir is None or not self._load_index_artifact(artifact_dir):
+            self.document_chunks = self._load_and_chunk_documents()
+            self.chunk_keys = self._chunk_keys()
+            self._initialize_embeddings()
+        self._build_vector_index()
+        self._build_lexical_index()
+        self._build_entity_index()
 
         logger.info("🎉 Enhanced RAG Agent initialization complete!")
 
+    def reset_client(self):
+        """Recreate the OpenAI client, e.g. after the process was forked"""
+        # Connection pools are not safe to share between forked processes
+        reset_openai_clients()
+        self.client = get_openai_client()
+
     def _load_rules(self) -> str:
         """Load rules.txt content"""
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -168,7 +359,6 @@ class EnhancedRAGAgent:
 
     def _load_and_chunk_documents(self) -> List[DocumentChunk]:
         """Load all documents and split them into chunks"""
-        all_chunks = []
         current_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(current_dir)
         data_path = os.path.join(project_root, "data")
@@ -183,37 +373,55 @@ class EnhancedRAGAgent:
                 else:
                     return []
 
-            md_files = [f for f in os.listdir(data_path) if f.endswith(".md")]
-            logger.info(f"📄 Found {len(md_files)} .md files")
-
-            for filename in md_files:
-                file_path = os.path.join(data_path, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-
-                    # Split document into chunks
-                    chunks = self.text_splitter.split_text(content, filename)
-                    all_chunks.extend(chunks)
-
-                    logger.info(
-                        f"📖 Processed {filename}: {len(content)} chars → {len(chunks)} chunks"
-                    )
-
-                except Exception as e:
-                    logger.error(f"❌ Error reading {filename}: {e}")
-
-            logger.info(f"✅ Total chunks created: {len(all_chunks)}")
-            return all_chunks
+            return chunk_documents(data_path, self.text_splitter)
 
         except Exception as e:
             logger.error(f"❌ Error loading documents: {e}")
             return []
 
-    def _get_cache_path(self) -> str:
-        """Get cache file path for embeddings"""
+    def _get_artifact_dir(self) -> Optional[str]:
+        """Directory of a prebuilt index artifact, if one is configured or present"""
+        artifact_dir = os.getenv("RAG_INDEX_DIR")
+        if artifact_dir:
+            return artifact_dir
+
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        cache_dir = os.path.join(current_dir, ".cache")
+        project_root = os.path.dirname(current_dir)
+        default_dir = os.path.join(project_root, "index")
+        if os.path.exists(os.path.join(default_dir, ARTIFACT_FILENAME)):
+            return default_dir
+        return None
+
+    def _load_index_artifact(self, artifact_dir: str) -> bool:
+        """Serve chunks and embeddings from a prebuilt artifact (read-only)"""
+        loaded = load_index_artifact(artifact_dir)
+        if loaded is None:
+            if os.getenv("RAG_INDEX_DIR"):
+                # An explicitly configured artifact must not silently fall back
+                # to embedding the whole corpus inside a serving process
+                raise RuntimeError(f"Cannot load index artifact from {artifact_dir}")
+            return False
+
+        _, store, chunks = loaded
+        if store.model != EMBEDDING_MODEL:
+            raise RuntimeError(
+                f"Index artifact uses {store.model}, expected {EMBEDDING_MODEL}"
+            )
+
+        self.document_chunks = [
+            DocumentChunk(**{name: value for name, value in chunk.items() if name != "key"})
+            for chunk in chunks
+        ]
+        self.chunk_keys = [chunk["key"] for chunk in chunks]
+        self.embedding_store = store
+        self.embedding_ids = np.arange(store.count)
+        self.embedding_matrix = store.vectors
+        return True
+
+    def _get_cache_path(self) -> Optional[str]:
+        """Get cache directory for the embedding store"""
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        cache_dir = os.path.join(current_dir, ".cache", "embeddings")
 
         # Check if we're in a read-only environment (like Vercel)
         try:
@@ -223,7 +431,7 @@ class EnhancedRAGAgent:
             with open(test_file, "w") as f:
                 f.write("test")
             os.remove(test_file)
-            return os.path.join(cache_dir, "embeddings_cache.pkl")
+            return cache_dir
         except (OSError, PermissionError):
             # Read-only file system - return None to disable caching
             logger.warning(
@@ -231,174 +439,267 @@ class EnhancedRAGAgent:
             )
             return None
 
-    def _calculate_content_hash(self) -> str:
+    def _chunk_keys(self) -> List[str]:
+        """Content-addressed cache key of every chunk, in chunk order"""
+        return [
+            chunk_cache_key(EMBEDDING_MODEL, chunk.content)
+            for chunk in self.document_chunks
+        ]
+
+    def _calculate_content_hash(self, chunk_keys: List[str]) -> str:
         """Calculate hash of all document contents for cache validation"""
-        content_str = ""
-        for chunk in self.document_chunks:
-            content_str += f"{chunk.filename}:{chunk.content}"
-        return hashlib.md5(content_str.encode()).hexdigest()
+        return calculate_content_hash(self.document_chunks, chunk_keys)
+
+    def _chunk_metadata(self, chunk_keys: List[str]) -> List[Dict[str, Any]]:
+        """Chunk metadata recorded in the embedding store manifest"""
+        return [
+            {
+                "key": key,
+                "filename": chunk.filename,
+                "chunk_id": chunk.chunk_id,
+                "start_char": chunk.start_char,
+                "end_char": chunk.end_char,
+                "heading_path": chunk.heading_path,
+            }
+            for chunk, key in zip(self.document_chunks, chunk_keys)
+        ]
 
     def _initialize_embeddings(self):
-        """Initialize or load cached embeddings"""
+        """Initialize embeddings, re-embedding only chunks missing from the cache"""
         cache_path = self._get_cache_path()
+        chunk_keys = self.chunk_keys
 
         # If cache_path is None, we're in a read-only environment
         if cache_path is None:
             logger.info(
                 "🔄 Generating embeddings without caching (read-only environment)..."
             )
-            self._generate_embeddings(None, None)
+            self._set_embeddings(self._generate_embeddings(chunk_keys, None))
             return
 
-        current_hash = self._calculate_content_hash()
-
-        # Try to load from cache
-        if os.path.exists(cache_path):
-            try:
-                logger.info("🔄 Loading embeddings from cache...")
-                with open(cache_path, "rb") as f:
-                    cache_data = pickle.load(f)
+        current_hash = self._calculate_content_hash(chunk_keys)
+
+        # Try to memory-map the existing store
+        store = EmbeddingStore.load(cache_path)
+        if (
+            store is not None
+            and store.content_hash == current_hash
+            and store.count == len(self.document_chunks)
+        ):
+            logger.info(f"✅ Cache is valid, using {store.count} memory-mapped embeddings")
+            self.embedding_store = store
+            self.embedding_ids = np.arange(store.count)
+            self.embedding_matrix = store.vectors
+            return
 
-                if cache_data.get("content_hash") == current_hash:
-                    logger.info("✅ Cache is valid, loading embeddings")
-                    embeddings = cache_data["embeddings"]
+        # Reuse every cached row whose (model, text) key is unchanged
+        cached_rows = store.rows_by_key() if store is not None else {}
+        vectors_by_key = {}
+        missing = []
+        for i, key in enumerate(chunk_keys):
+            row = cached_rows.get(key)
+            if row is not None and store.dim == EMBEDDING_DIM:
+                vectors_by_key[key] = store.vectors[row]
+            else:
+                missing.append(i)
 
-                    # Assign embeddings to chunks
-                    for i, chunk in enumerate(self.document_chunks):
-                        if i < len(embeddings):
-                            chunk.embedding = embeddings[i]
+        logger.info(
+            f"🔄 Embedding cache: {len(chunk_keys) - len(missing)} reused, {len(missing)} to embed"
+        )
+        checkpoint_dir = os.path.join(cache_path, "checkpoints")
+        if missing:
+            vectors_by_key.update(self._generate_embeddings(
+                [chunk_keys[i] for i in missing], checkpoint_dir
+            ))
 
-                    logger.info(f"✅ Loaded {len(embeddings)} embeddings from cache")
-                    return
-                else:
-                    logger.info("⚠️ Cache is outdated, will regenerate embeddings")
-            except Exception as e:
-                logger.warning(f"⚠️ Error loading cache: {e}")
+        self._set_embeddings(vectors_by_key)
+        embedded = set(self.embedding_ids.tolist())
+        complete = len(embedded) == len(self.document_chunks)
 
-        # Generate new embeddings
-        logger.info("🔄 Generating new embeddings...")
-        self._generate_embeddings(cache_path, current_hash)
+        try:
+            self.embedding_store = EmbeddingStore.save(
+                cache_path,
+                self.embedding_matrix,
+                model=EMBEDDING_MODEL,
+                chunks=[
+                    meta
+                    for i, meta in enumerate(self._chunk_metadata(chunk_keys))
+                    if i in embedded
+                ],
+                # A partial store is reused by key but never taken as up to date
+                content_hash=current_hash if complete else None,
+            )
+            # Serve from the mapped file so worker processes share the pages
+            self.embedding_matrix = self.embedding_store.vectors
+            if complete:
+                self._embedding_pipeline(checkpoint_dir).clear_checkpoints()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to cache embeddings: {e}")
+
+    def _set_embeddings(self, vectors_by_key: Dict[str, np.ndarray]):
+        """Arrange embedded vectors in chunk order, skipping chunks without one"""
+        chunk_keys = self.chunk_keys
+        ids = [i for i, key in enumerate(chunk_keys) if key in vectors_by_key]
+        self.embedding_ids = np.array(ids, dtype=np.int64)
+        if ids:
+            self.embedding_matrix = np.array(
+                [vectors_by_key[chunk_keys[i]] for i in ids], dtype=np.float32
+            )
+        else:
+            self.embedding_matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        skipped = len(chunk_keys) - len(ids)
+        if skipped:
+            logger.warning(f"⚠️ {skipped} chunks have no embedding and are not searchable")
+
+    def _embedding_pipeline(self, checkpoint_dir: Optional[str]) -> EmbeddingPipeline:
+        return EmbeddingPipeline(
+            self.client,
+            EMBEDDING_MODEL,
+            max_workers=int(os.getenv("EMBEDDING_WORKERS", "4")),
+            max_batch_tokens=int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000")),
+            checkpoint_dir=checkpoint_dir,
+        )
 
     def _generate_embeddings(
-        self, cache_path: Optional[str], content_hash: Optional[str]
-    ):
-        """Generate embeddings for all chunks"""
-        texts = [chunk.content for chunk in self.document_chunks]
-
-        if not texts:
+        self, chunk_keys: List[str], checkpoint_dir: Optional[str]
+    ) -> Dict[str, np.ndarray]:
+        """Generate embeddings for the chunks with the given cache keys"""
+        if not chunk_keys:
             logger.warning("⚠️ No text content to embed")
-            return
+            return {}
+
+        wanted = set(chunk_keys)
+        keys, texts = [], []
+        for key, chunk in zip(self.chunk_keys, self.document_chunks):
+            if key in wanted:
+                keys.append(key)
+                texts.append(chunk.content)
 
         logger.info(f"🧠 Generating embeddings for {len(texts)} chunks...")
+        vectors_by_key = self._embedding_pipeline(checkpoint_dir).embed(keys, texts)
+        logger.info(f"✅ Generated {len(vectors_by_key)} embeddings")
+        return vectors_by_key
 
-        # Generate embeddings in batches to avoid API limits
-        # Use smaller batch size for Vercel to reduce initialization time
-        batch_size = 50
-        all_embeddings = []
+    def _get_query_embedding(self, query: str) -> np.ndarray:
+        """Get embedding for query text, from the cache when possible"""
+        cached = self.query_cache.get(EMBEDDING_MODEL, query)
+        if cached is not None:
+            return cached
 
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
-            logger.info(
-                f"📡 Processing batch {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}"
+        try:
+            response = self.client.embeddings.create(
+                model=EMBEDDING_MODEL, input=[query]
+            )
+            embedding = np.array(response.data[0].embedding, dtype=np.float32)
+            self.query_cache.put(EMBEDDING_MODEL, query, embedding)
+            return embedding
+        except Exception as e:
+            logger.error(f"❌ Error getting query embedding: {e}")
+            # Fallback zero vector, never cached
+            return np.zeros(EMBEDDING_DIM, dtype=np.float32)
+
+    def _build_vector_index(self):
+        """Pack all chunk embeddings into a single normalized search matrix"""
+        if self.embedding_store is not None:
+            # Store rows are already normalized; search straight from the mapping
+            self.vector_index = VectorIndex.from_normalized(
+                self.embedding_ids, self.embedding_matrix
             )
-
-            try:
-                response = self.client.embeddings.create(
-                    model="text-embedding-3-small",  # More cost-effective model
-                    input=batch,
-                )
-
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-
-            except Exception as e:
-                logger.error(f"❌ Error generating embeddings for batch: {e}")
-                # Use zero vectors as fallback
-                fallback_embeddings = [[0.0] * 1536] * len(batch)
-                all_embeddings.extend(fallback_embeddings)
-
-        # Assign embeddings to chunks
-        for i, chunk in enumerate(self.document_chunks):
-            if i < len(all_embeddings):
-                chunk.embedding = all_embeddings[i]
-
-        # Cache the embeddings (only if cache_path is available)
-        if cache_path is not None and content_hash is not None:
-            try:
-                cache_data = {
-                    "content_hash": content_hash,
-                    "embeddings": all_embeddings,
-                }
-                with open(cache_path, "wb") as f:
-                    pickle.dump(cache_data, f)
-                logger.info(f"💾 Cached {len(all_embeddings)} embeddings")
-            except Exception as e:
-                logger.warning(f"⚠️ Failed to cache embeddings: {e}")
         else:
-            logger.info(
-                f"✅ Generated {len(all_embeddings)} embeddings (no caching in read-only environment)"
+            self.vector_index = VectorIndex(
+                dim=self.embedding_matrix.shape[1] or EMBEDDING_DIM,
+                initial_capacity=len(self.embedding_matrix),
             )
+            self.vector_index.add(self.embedding_ids, self.embedding_matrix)
+        # Identifies the corpus the index was built from (for answer caching)
+        if self.embedding_store is not None:
+            self.index_version = self.embedding_store.version
+        else:
+            self.index_version = self._calculate_content_hash(self.chunk_keys)
 
-    def _get_query_embedding(self, query: str) -> List[float]:
-        """Get embedding for query text"""
+        # Sub-linear search for large corpora; small ones stay exact (ANN_BACKEND),
+        # optionally over compact codes instead of float32 (VECTOR_QUANTIZATION)
+        store_dir = self.embedding_store.directory if self.embedding_store else None
+        ann = None
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small", input=[query]
+            ann = load_or_build_ann_index(
+                self.vector_index.matrix, self.index_version, directory=store_dir
             )
-            return response.data[0].embedding
+            self.vector_index.set_ann(ann)
         except Exception as e:
-            logger.error(f"❌ Error getting query embedding: {e}")
-            return [0.0] * 1536  # Fallback zero vector
-
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
+            logger.error(f"❌ Error building ANN index, using exact search: {e}")
         try:
-            # Convert to numpy arrays for efficient computation
-            a = np.array(vec1)
-            b = np.array(vec2)
+            quantizer = load_or_build_quantizer(
+                self.vector_index.matrix,
+                self.index_version,
+                directory=store_dir,
+                ann_active=ann is not None,
+            )
+            self.vector_index.set_quantizer(
+                quantizer, shortlist=int(os.getenv("QUANT_SHORTLIST", "100"))
+            )
+        except Exception as e:
+            logger.error(f"❌ Error encoding vectors, using float32 search: {e}")
 
-            # Calculate cosine similarity
-            dot_product = np.dot(a, b)
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
+        if self.vector_index.ann:
+            backend = self.vector_index.ann.backend
+        elif self.vector_index.quantizer:
+            backend = f"{self.vector_index.quantizer.kind} + float32 rescoring"
+        else:
+            backend = "exact"
+        logger.info(
+            f"🧮 Vector index built with {len(self.vector_index)} vectors ({backend} search)"
+        )
 
-            if norm_a == 0 or norm_b == 0:
-                return 0.0
+    def _build_lexical_index(self):
+        """Load or build the BM25 inverted index over all chunk texts"""
+        self.lexical_index = load_or_build_lexical_index(
+            [chunk.content for chunk in self.document_chunks],
+            self.index_version,
+            directory=self.embedding_store.directory if self.embedding_store else None,
+        )
 
-            return dot_product / (norm_a * norm_b)
-        except Exception as e:
-            logger.error(f"❌ Error calculating cosine similarity: {e}")
-            return 0.0
+    def _build_entity_index(self):
+        """Load or extract phones, emails, areas and provinces of every chunk"""
+        self.entity_index = load_or_build_entity_index(
+            [chunk.content for chunk in self.document_chunks],
+            self.index_version,
+            directory=self.embedding_store.directory if self.embedding_store else None,
+        )
 
     def _rerank_chunks(
-        self, query: str, initial_results: List[Tuple[DocumentChunk, float]]
+        self,
+        query: str,
+        initial_results: List[Tuple[int, float, float]],
+        query_entities: Dict[str, Set[int]],
     ) -> List[RetrievalResult]:
-        """Re-rank chunks using multiple factors"""
+        """Re-rank (chunk index, similarity, keyword score) candidates using multiple factors"""
         reranked_results = []
 
         # Enhanced keyword-based re-ranking
         query_words = set(query.lower().split())
 
-        # Extract phone numbers from query if present
-        import re
+        # Chunks that contain a phone number or email from the query, and chunks
+        # that match every address / area / province named in it (hash lookups)
+        contact_matches = set().union(
+            *(ids for entity, ids in query_entities.items()
+              if entity.startswith(("phone:", "email:")))
+        )
+        location_sets = [
+            ids for entity, ids in query_entities.items()
+            if entity.startswith(("address:", "area:", "province:"))
+        ]
+        location_matches = set.intersection(*location_sets) if location_sets else set()
 
-        phone_numbers = re.findall(r"\d{4}\.\d{3}\.\d{3}|\d{10}", query)
+        for chunk_index, similarity_score, keyword_overlap in initial_results:
+            chunk = self.document_chunks[chunk_index]
 
-        for chunk, similarity_score in initial_results:
-            # Calculate keyword overlap score
-            chunk_words = set(chunk.content.lower().split())
-            keyword_overlap = len(query_words.intersection(chunk_words)) / max(
-                len(query_words), 1
-            )
+            # Exact phone number / email match
+            phone_bonus = 0.5 if chunk_index in contact_matches else 0.0
 
-            # Enhanced phone number matching
-            phone_bonus = 0.0
-            if phone_numbers:
-                for phone in phone_numbers:
-                    if phone in chunk.content or phone.replace(
-                        ".", ""
-                    ) in chunk.content.replace(".", ""):
-                        phone_bonus = 0.5  # High bonus for exact phone number match
+            # Same street / ward, "khu vực N" and province as the query
+            location_bonus = 0.1 if chunk_index in location_matches else 0.0
 
             # Calculate position bonus (earlier chunks might be more important)
             position_bonus = 1.0 / (chunk.chunk_id + 1) * 0.05
@@ -416,8 +717,9 @@ class EnhancedRAGAgent:
             # Combine scores with enhanced weighting
             rerank_score = (
                 similarity_score * 0.6  # Embedding similarity (primary)
-                + keyword_overlap * 0.2  # Keyword overlap
+                + keyword_overlap * 0.2  # BM25 keyword score, normalized to [0, 1]
                 + phone_bonus  # Phone number exact match (highest priority)
+                + location_bonus  # Area / province match
                 + position_bonus  # Position in document
                 + filename_bonus  # Filename relevance
                 + content_length_bonus  # Prefer more comprehensive chunks
@@ -429,6 +731,7 @@ class EnhancedRAGAgent:
 
             result = RetrievalResult(
                 chunk=chunk,
+                chunk_index=chunk_index,
                 similarity_score=similarity_score,
                 rerank_score=rerank_score,
                 final_score=final_score,
@@ -440,21 +743,22 @@ class EnhancedRAGAgent:
 
         logger.info(f"🔄 Re-ranked {len(reranked_results)} results")
 
-        # Log phone number matches for debugging
-        if phone_numbers:
-            logger.info(f"📞 Looking for phone numbers: {phone_numbers}")
+        # Log entity matches for debugging
+        if query_entities:
+            logger.info(f"🏷️ Query entities: {sorted(query_entities)}")
             for i, result in enumerate(reranked_results[:3]):
-                has_phone = any(
-                    phone in result.chunk.content for phone in phone_numbers
-                )
+                has_contact = result.chunk_index in contact_matches
                 logger.info(
-                    f"📄 #{i+1}: {result.chunk.filename} (final: {result.final_score:.3f}, has_phone: {has_phone})"
+                    f"📄 #{i+1}: {result.chunk.filename} (final: {result.final_score:.3f}, has_phone: {has_contact})"
                 )
 
         return reranked_results
 
     def _retrieve_relevant_chunks(
-        self, query: str, top_k: Optional[int] = None
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> List[RetrievalResult]:
         """Retrieve and re-rank relevant document chunks"""
         if top_k is None:
@@ -463,26 +767,50 @@ class EnhancedRAGAgent:
         logger.info(f"🔍 Retrieving relevant chunks for query: {query[:100]}...")
 
         # Get query embedding
-        query_embedding = self._get_query_embedding(query)
+        if query_embedding is None:
+            query_embedding = self._get_query_embedding(query)
+
+        # Vector and BM25 search over all chunks, fused by reciprocal rank;
+        # take extra candidates for re-ranking
+        num_candidates = top_k * 4
+        vector_hits = self.vector_index.search(query_embedding, num_candidates)
+        lexical_hits = self.lexical_index.search(query, num_candidates)
+
+        # Chunks sharing entities (phones, emails, addresses, areas, provinces) with the query
+        query_entities = self.entity_index.lookup(query)
+        entity_counts = Counter(
+            chunk_index for ids in query_entities.values() for chunk_index in ids
+        )
+        entity_hits = [
+            (chunk_index, float(count))
+            for chunk_index, count in entity_counts.most_common(num_candidates)
+        ]
 
-        # Calculate similarities
-        similarities = []
-        for chunk in self.document_chunks:
-            if chunk.embedding is None:
-                continue
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits, entity_hits])[
+            :num_candidates
+        ]
+        candidate_ids = [chunk_index for chunk_index, _ in fused]
 
-            similarity = self._cosine_similarity(query_embedding, chunk.embedding)
-            similarities.append((chunk, similarity))
+        similarities = dict(vector_hits)
+        lexical_only = [i for i in candidate_ids if i not in similarities]
+        similarities.update(self.vector_index.score(query_embedding, lexical_only))
 
-        # Sort by similarity and take top candidates
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        # Get more candidates for better re-ranking (especially for complex documents)
-        top_candidates = similarities[: top_k * 4]  # Increased from 2x to 4x
+        lexical_scores = dict(lexical_hits)
+        max_lexical = max(lexical_scores.values(), default=0.0) or 1.0
+
+        top_candidates = [
+            (
+                chunk_index,
+                similarities.get(chunk_index, 0.0),
+                lexical_scores.get(chunk_index, 0.0) / max_lexical,
+            )
+            for chunk_index in candidate_ids
+        ]
 
         logger.info(f"📊 Found {len(top_candidates)} candidate chunks")
 
         # Re-rank the candidates
-        reranked_results = self._rerank_chunks(query, top_candidates)
+        reranked_results = self._rerank_chunks(query, top_candidates, query_entities)
 
         # Enhanced result selection: ensure we get comprehensive coverage
         final_results = self._select_comprehensive_results(
@@ -520,7 +848,7 @@ class EnhancedRAGAgent:
             # Include additional chunks from the same document if they contain relevant info
             elif document_chunk_count[filename] <= 3 and result.final_score > 0.3:
                 # Check if this chunk contains complementary information
-                if self._has_complementary_info(result.chunk.content, query):
+                if self._has_complementary_info(result.chunk_index):
                     selected_results.append(result)
 
         # Sort final results by score
@@ -531,22 +859,52 @@ class EnhancedRAGAgent:
             : top_k * 2
         ]  # Allow more results for comprehensive answers
 
-    def _has_complementary_info(self, content: str, query: str) -> bool:
-        """Check if content has complementary information to the query"""
-        import re
-
-        # Check for structured data patterns (tables, lists, etc.)
-        has_table = "|" in content or "Số TT" in content
-        has_contact_info = bool(
-            re.search(r"\d{4}\.\d{3}\.\d{3}|email|địa chỉ", content, re.IGNORECASE)
-        )
-        has_organizational_info = bool(
-            re.search(r"phòng|khu vực|viện|đơn vị", content, re.IGNORECASE)
+    def _has_complementary_info(self, chunk_index: int) -> bool:
+        """Check if a chunk has complementary information (precomputed flags)"""
+        return self.entity_index.has_flags(
+            chunk_index, HAS_TABLE | HAS_CONTACT_INFO | HAS_ORGANIZATIONAL_INFO
         )
 
-        return has_table or has_contact_info or has_organizational_info
+    def _check_relevance(
+        self,
+        question: str,
+        embedding_future: Optional[Future] = None,
+        llm_future: Optional[Future] = None,
+    ) -> RelevanceCheck:
+        """Check relevance locally, asking the LLM only when the gate is unsure.
+
+        ``llm_future`` is an LLM check started speculatively; it is cancelled
+        (or its result ignored) when the local gate decides.
+        """
+        if self.relevance_gate is not None:
+            if embedding_future is not None:
+                query_embedding = embedding_future.result()
+            else:
+                query_embedding = self._get_query_embedding(question)
+            hits = self.vector_index.search(query_embedding, 3)
+            decision = self.relevance_gate.decide(
+                query_embedding, [score for _, score in hits]
+            )
+            if decision is not None:
+                relevant, confidence, reasoning = decision
+                logger.info(
+                    f"✅ Relevance (local): {relevant}, confidence: {confidence:.2f} - {reasoning}"
+                )
+                if llm_future is not None:
+                    llm_future.cancel()
+                return RelevanceCheck(
+                    relevant=relevant,
+                    confidence=confidence,
+                    reasoning=reasoning,
+                    source="local",
+                )
+            logger.info("🤔 Local relevance gate uncertain - falling back to LLM")
+
+        if llm_future is not None:
+            return llm_future.result()
+        return self._check_relevance_llm(question)
 
-    def _check_relevance(self, question: str) -> RelevanceCheck:
+    def _check_relevance_llm(self, question: str) -> RelevanceCheck:
         """Check if question is relevant using OpenAI"""
         logger.info(f"🤔 Checking relevance for question: {question[:100]}...")
 
@@ -596,7 +954,7 @@ Examples:
             relevance_check = RelevanceCheck(**result)
 
             logger.info(
-                f"✅ Relevance: {relevance_check.relevant}, confidence: {relevance_check.confidence}"
+                f"✅ Relevance (llm): {relevance_check.relevant}, confidence: {relevance_check.confidence}"
             )
             return relevance_check
 
@@ -612,25 +970,95 @@ Examples:
         self, question: str, conversation_history: List[Dict[str, str]] = None
     ):
         """Get streaming response using enhanced RAG with embeddings and re-ranking"""
+        prepared = self._prepare_response(question, conversation_history)
+        if prepared.cached_answer is not None:
+            return self._replay_answer(prepared.cached_answer)
+        return self._stream_openai_response(
+            prepared.messages, on_complete=prepared.on_complete
+        )
+
+    async def aget_streaming_response(
+        self, question: str, conversation_history: List[Dict[str, str]] = None
+    ):
+        """Async variant: the answer is streamed with AsyncOpenAI.
+
+        Embedding, relevance and retrieval still run on the RAG_PREPARE_WORKERS
+        pool; only the long generation is awaited on the event loop, so one
+        process can hold many concurrent streams.
+        """
+        prepared = await asyncio.get_running_loop().run_in_executor(
+            self._prepare_executor, self._prepare_response, question, conversation_history
+        )
+        if prepared.cached_answer is not None:
+            for piece in self._replay_answer(prepared.cached_answer):
+                yield piece
+            return
+        async for piece in self._astream_openai_response(
+            prepared.messages, on_complete=prepared.on_complete
+        ):
+            yield piece
+
+    def _prepare_response(
+        self, question: str, conversation_history: List[Dict[str, str]] = None
+    ) -> PreparedResponse:
+        """Everything before generation: cache lookup, relevance, retrieval, prompt"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logger.info(f"🚀 NEW ENHANCED REQUEST at {timestamp}: {question}")
 
         if conversation_history is None:
             conversation_history = []
 
-        # Step 1: Check relevance
-        relevance_check = self._check_relevance(question)
+        # Step 1 + 2: The embedding, the relevance check (possibly an LLM call)
+        # and retrieval (search on the embedding) all start at once; the local
+        # gate and retrieval share the one embedding future, and the LLM check
+        # the gate may fall back to is already running (RELEVANCE_SPECULATE)
+        embedding_future = self._executor.submit(self._get_query_embedding, question)
+        llm_relevance_future = None
+        if self.speculative_relevance:
+            llm_relevance_future = self._executor.submit(self._check_relevance_llm, question)
+        relevance_future = self._executor.submit(
+            self._check_relevance, question, embedding_future, llm_relevance_future
+        )
+        retrieval_future = self._executor.submit(
+            lambda: self._retrieve_relevant_chunks(
+                question, query_embedding=embedding_future.result()
+            )
+        )
+
+        # Step 0: Serve hot questions from the answer cache once the embedding
+        # arrives. Only questions without conversation history are cacheable,
+        # since history changes the answer, and a hit must name the same
+        # phones / areas / provinces as the question.
+        cache_key_embedding = None
+        if not conversation_history and self.answer_cache.enabled:
+            query_embedding = embedding_future.result()
+            if np.any(query_embedding):
+                question_entities = frozenset(extract_entities(question))
+                cached_answer = self.answer_cache.lookup(
+                    query_embedding, self.index_version, question_entities
+                )
+                if cached_answer is not None:
+                    # Queued work is dropped; a call already in flight is ignored
+                    relevance_future.cancel()
+                    retrieval_future.cancel()
+                    if llm_relevance_future is not None:
+                        llm_relevance_future.cancel()
+                    return PreparedResponse(cached_answer=cached_answer)
+                cache_key_embedding = query_embedding
+
+        relevance_check = relevance_future.result()
 
         if not relevance_check.relevant:
             logger.info("🚫 Question not relevant - providing general response")
-            return self._get_basic_response(question)
+            # The retrieval result is simply discarded
+            retrieval_future.cancel()
+            return PreparedResponse(messages=self._basic_messages(question))
 
-        # Step 2: Retrieve relevant chunks using embeddings + re-ranking
-        relevant_results = self._retrieve_relevant_chunks(question)
+        relevant_results = retrieval_future.result()
 
         if not relevant_results:
             logger.warning("⚠️ No relevant chunks found")
-            return self._get_no_docs_response(question)
+            return PreparedResponse(messages=self._no_docs_messages(question))
 
         # Log retrieval statistics
         logger.info(
@@ -644,47 +1072,8 @@ Examples:
         for filename, count in doc_stats.items():
             logger.info(f"📄 {filename}: {count} chunks")
 
-        # Step 3: Prepare context from relevant chunks
-        context_parts = []
-        used_files = set()
-
-        # Group chunks by document for better organization
-        chunks_by_document = {}
-        for result in relevant_results:
-            filename = result.chunk.filename
-            if filename not in chunks_by_document:
-                chunks_by_document[filename] = []
-            chunks_by_document[filename].append(result)
-
-        # Sort documents by highest scoring chunk
-        sorted_documents = sorted(
-            chunks_by_document.items(),
-            key=lambda x: max(r.final_score for r in x[1]),
-            reverse=True,
-        )
-
-        for filename, chunks in sorted_documents:
-            # Add document header
-            max_score = max(r.final_score for r in chunks)
-            context_parts.append(
-                f"**Document: {filename}** (Max Score: {max_score:.3f})"
-            )
-
-            # Sort chunks within document by chunk_id to maintain logical order
-            chunks.sort(key=lambda x: x.chunk.chunk_id)
-
-            # Combine content from multiple chunks of the same document
-            combined_content = []
-            for result in chunks:
-                chunk = result.chunk
-                combined_content.append(chunk.content)
-
-            # Join chunks with some indication of boundaries
-            document_content = "\n\n---\n\n".join(combined_content)
-            context_parts.append(document_content)
-            context_parts.append("")  # Add spacing between documents
-
-        context = "\n".join(context_parts)
+        # Step 3: Pack the best chunks into the prompt budget, merging overlaps
+        context = build_context(relevant_results, self.context_max_tokens)
 
         # Step 4: Format conversation history
         history_text = ""
@@ -702,10 +1091,27 @@ Examples:
 
         # Step 5: Generate response
         logger.info("📍 Generating enhanced RAG response...")
-        return self._get_enhanced_response(question, context, history_text)
+        on_complete = None
+        if cache_key_embedding is not None:
+            index_version = self.index_version
+
+            def on_complete(answer: str):
+                self.answer_cache.store(
+                    cache_key_embedding, index_version, answer, question_entities
+                )
+
+        return PreparedResponse(
+            messages=self._enhanced_messages(question, context, history_text),
+            on_complete=on_complete,
+        )
 
-    def _get_basic_response(self, question: str):
-        """Generate basic response for non-relevant questions"""
+    def _replay_answer(self, answer: str, piece_size: int = 256):
+        """Stream a cached answer in pieces, like a live completion"""
+        for start in range(0, len(answer), piece_size):
+            yield answer[start : start + piece_size]
+
+    def _basic_messages(self, question: str) -> List[Dict[str, str]]:
+        """Prompt for non-relevant questions"""
         messages = [
             {
                 "role": "system",
@@ -722,10 +1128,10 @@ Respond politely in Vietnamese and suggest they ask about:
             {"role": "user", "content": question},
         ]
 
-        return self._stream_openai_response(messages)
+        return messages
 
-    def _get_no_docs_response(self, question: str):
-        """Generate response when no relevant documents found"""
+    def _no_docs_messages(self, question: str) -> List[Dict[str, str]]:
+        """Prompt when no relevant documents were found"""
         messages = [
             {
                 "role": "system",
@@ -738,10 +1144,12 @@ Respond politely in Vietnamese and suggest the user provide more specific inform
             {"role": "user", "content": question},
         ]
 
-        return self._stream_openai_response(messages)
+        return messages
 
-    def _get_enhanced_response(self, question: str, context: str, history: str):
-        """Generate enhanced response with document context"""
+    def _enhanced_messages(
+        self, question: str, context: str, history: str
+    ) -> List[Dict[str, str]]:
+        """Prompt with the retrieved document context"""
         system_prompt = f"""You are a professional Vietnamese legal assistant developed by Hoàng Yến.
 
 🌟 VIETNAMESE LEGAL AI ASSISTANT DEVELOPED BY HOÀNG YẾN 🌟
@@ -770,10 +1178,14 @@ Current question: {question}"""
             {"role": "user", "content": question},
         ]
 
-        return self._stream_openai_response(messages)
+        return messages
+
+    def _stream_openai_response(self, messages, on_complete=None):
+        """Stream response from OpenAI.
 
-    def _stream_openai_response(self, messages):
-        """Stream response from OpenAI"""
+        on_complete, if given, receives the full answer text once the stream
+        finishes without errors (it is not called for aborted streams).
+        """
         try:
             stream = self.client.chat.completions.create(
                 model="gpt-4.1-mini",
@@ -783,10 +1195,43 @@ Current question: {question}"""
                 max_tokens=4086,
             )
 
+            parts = []
             for chunk in stream:
                 if chunk.choices[0].delta.content is not None:
+                    parts.append(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
 
+            if on_complete is not None:
+                on_complete("".join(parts))
+
+        except Exception as e:
+            logger.error(f"❌ Streaming error: {e}")
+            yield f"⚠️ Xin lỗi, đã có lỗi xảy ra: {str(e)}"
+
+    async def _astream_openai_response(self, messages, on_complete=None):
+        """Async version of _stream_openai_response using the shared AsyncOpenAI client"""
+        try:
+            stream = await get_async_openai_client().chat.completions.create(
+                model="gpt-4.1-mini",
+                messages=messages,
+                temperature=0,
+                stream=True,
+                max_tokens=4086,
+            )
+
+            parts = []
+            try:
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content is not None:
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Free the connection as soon as the client goes away
+                await stream.close()
+
+            if on_complete is not None:
+                on_complete("".join(parts))
+
         except Exception as e:
             logger.error(f"❌ Streaming error: {e}")
             yield f"⚠️ Xin lỗi, đã có lỗi xảy ra: {str(e)}"
@@ -794,21 +1239,55 @@ Current question: {question}"""
 
 # Initialize enhanced RAG agent lazily
 _enhanced_agent = None
+_enhanced_agent_lock = threading.Lock()
 
 
 def get_enhanced_agent():
     """Lazy initialization of enhanced RAG agent"""
     global _enhanced_agent
     if _enhanced_agent is None:
-        logger.info("🎬 Starting Enhanced RAG Agent initialization...")
-        _enhanced_agent = EnhancedRAGAgent()
-        logger.info("🌟 Enhanced RAG Agent is ready to serve requests!")
+        # Warm-up threads and early requests must not build the index twice
+        with _enhanced_agent_lock:
+            if _enhanced_agent is None:
+                logger.info("🎬 Starting Enhanced RAG Agent initialization...")
+                _enhanced_agent = EnhancedRAGAgent()
+                logger.info("🌟 Enhanced RAG Agent is ready to serve requests!")
     return _enhanced_agent
 
 
+def is_enhanced_agent_ready() -> bool:
+    """Whether the agent and its index are loaded, without triggering a load"""
+    return _enhanced_agent is not None
+
+
+def get_enhanced_agent_stats() -> Dict[str, Any]:
+    """Cache counters of the loaded agent for /status"""
+    if _enhanced_agent is None:
+        return {}
+    return {
+        "query_embedding_cache": _enhanced_agent.query_cache.stats(),
+        "answer_cache": _enhanced_agent.answer_cache.stats(),
+    }
+
+
+def reset_enhanced_agent_client():
+    """Give a forked worker its own OpenAI client instead of the master's"""
+    if _enhanced_agent is not None:
+        _enhanced_agent.reset_client()
+
+
 def get_enhanced_streaming_response(
     question: str, conversation_history: List[Dict[str, str]] = None
 ):
     """Public function to get enhanced streaming response"""
     agent = get_enhanced_agent()
     return agent.get_streaming_response(question, conversation_history)
+
+
+async def get_enhanced_streaming_response_async(
+    question: str, conversation_history: List[Dict[str, str]] = None
+):
+    """Public async generator for the ASGI /ask endpoint"""
+    agent = await asyncio.to_thread(get_enhanced_agent)
+    async for piece in agent.aget_streaming_response(question, conversation_history):
+        yield piece
@@ -0,0 +1,256 @@
+import os
+import re
+import glob
+import json
+import logging
+import unicodedata
+from collections import defaultdict
+from typing import Iterator, List, Dict, Optional, Set, Sequence
+
+try:
+    from .lexical_index import fold_diacritics
+except ImportError:
+    from lexical_index import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever extraction rules or flags change, invalidating saved indexes
+ENTITY_INDEX_FORMAT = 3
+
+# Provinces and centrally-run cities, before and after the 2025 merger, unaccented
+PROVINCES = [
+    "an giang", "ba ria vung tau", "bac giang", "bac kan", "bac lieu", "bac ninh",
+    "ben tre", "binh dinh", "binh duong", "binh phuoc", "binh thuan", "ca mau",
+    "can tho", "cao bang", "da nang", "dak lak", "dak nong", "dien bien",
+    "dong nai", "dong thap", "gia lai", "ha giang", "ha nam", "ha noi", "ha tinh",
+    "hai duong", "hai phong", "hau giang", "hoa binh", "hung yen", "khanh hoa",
+    "kien giang", "kon tum", "lai chau", "lam dong", "lang son", "lao cai",
+    "long an", "nam dinh", "nghe an", "ninh binh", "ninh thuan", "phu tho",
+    "phu yen", "quang binh", "quang nam", "quang ngai", "quang ninh", "quang tri",
+    "soc trang", "son la", "tay ninh", "thai binh", "thai nguyen", "thanh hoa",
+    "thua thien hue", "hue", "tien giang", "tra vinh", "tuyen quang", "vinh long",
+    "vinh phuc", "yen bai", "ho chi minh", "hcm",
+]
+
+# A run of digit groups joined by spaces, dots or dashes, optionally behind a
+# +84 or "(0xxx)" prefix. The corpus mixes every shape ("02133.792.919",
+# "(0222) 3.825.637", "02703.822 115", "0299  3876272"), and a run may hold
+# several numbers ("0290.3831.234 - 0290.3831.235"); _find_phones splits it
+_PHONE_RUN_RE = re.compile(
+    r"(?<!\d)(?<!\d\.)(?:\+84|\(0\d{2,4}\)|\d)(?:(?:[.\-]|[^\S\r\n]){0,3}\d)*"
+)
+_PHONE_GROUP_RE = re.compile(r"\+84|\(0\d{2,4}\)|\d+")
+# Street, ward and commune names: the capitalized words after the keyword
+# ("đường Nguyễn Huy Tự", "phường Thành Sen", "xã Kỳ Anh", "Phường Hà Giang 2")
+_ADDRESS_RE = re.compile(
+    r"\b(?:đường|phố|phường|xã|thị trấn)\s+(\w+(?:[ \t]+\w+){0,4})", re.IGNORECASE
+)
+_ADDRESS_STOP_WORDS = {"duong", "pho", "phuong", "xa", "quan", "huyen", "so"}
+_EMAIL_RE = re.compile(r"[\w.\-]+@[\w\-]+(?:\.[\w\-]+)+")
+_AREA_RE = re.compile(r"khu vuc\s+(\d+)")
+_PROVINCE_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, PROVINCES), key=len, reverse=True)) + r")\b"
+)
+
+# Patterns behind the "complementary information" flags of a chunk
+_CONTACT_RE = re.compile(r"\d{4}\.\d{3}\.\d{3}|email|địa chỉ", re.IGNORECASE)
+_ORGANIZATION_RE = re.compile(r"phòng|khu vực|viện|đơn vị", re.IGNORECASE)
+
+HAS_TABLE = 1
+HAS_CONTACT_INFO = 2
+HAS_ORGANIZATIONAL_INFO = 4
+
+
+def normalize_phone(raw: str) -> str:
+    """Digits only, with a leading 0 for +84; '' if not a phone number"""
+    digits = re.sub(r"\D", "", raw)
+    if raw.lstrip().startswith("+84"):
+        digits = "0" + digits[2:]
+    elif not digits.startswith("0"):
+        # Written without the trunk 0: 9-digit mobiles ("912 345 678") and
+        # 10-digit landlines with a 2xx area code ("2393.853.210")
+        if (len(digits) == 9 and digits[0] in "35789") or (
+            len(digits) == 10 and digits[0] == "2"
+        ):
+            digits = "0" + digits
+    # Vietnamese numbers: 10-digit mobiles, 11-digit landlines (area code 02xx)
+    if digits.startswith("0") and 10 <= len(digits) <= 11:
+        return digits
+    return ""
+
+
+def _find_phones(text: str) -> Iterator[str]:
+    """Normalized phone numbers in text, splitting runs that hold several"""
+    for run in _PHONE_RUN_RE.finditer(text):
+        raw = run.group(0)
+        groups = list(_PHONE_GROUP_RE.finditer(raw))
+        i = 0
+        while i < len(groups):
+            phone, end = "", i
+            first = groups[i].group(0)
+            # A number starts the run or follows whitespace ("... 234 - 0290"),
+            # never inside "1.250.000", and has a multi-digit first group
+            separator = raw[groups[i - 1].end():groups[i].start()] if i else " "
+            if any(c.isspace() for c in separator) and (
+                first.startswith(("0", "+", "(")) or len(first) > 1
+            ):
+                digits = 0
+                for j in range(i, len(groups)):
+                    digits += sum(c.isdigit() for c in groups[j].group(0))
+                    if digits > 13:
+                        break
+                    candidate = normalize_phone(raw[groups[i].start():groups[j].end()])
+                    if candidate:
+                        phone, end = candidate, j
+            if phone:
+                yield phone
+                i = end + 1
+            else:
+                i += 1
+
+
+def _find_addresses(text: str) -> Iterator[str]:
+    """Folded street / ward / commune names; only capitalized words count"""
+    for match in _ADDRESS_RE.finditer(text):
+        words = []
+        for word in match.group(1).split():
+            folded = fold_diacritics(word).lower()
+            # Trailing numbers belong to the name ("Sơn Kim 1"); lowercase and
+            # all-caps words ("CỘNG HÒA XÃ HỘI") end it
+            capitalized = (word[0].isupper() and not word[1:].isupper()) or (
+                words and word.isdigit()
+            )
+            if not capitalized or folded in _ADDRESS_STOP_WORDS:
+                break
+            words.append(folded)
+        if words and not words[0].isdigit():
+            yield " ".join(words)
+
+
+def extract_entities(text: str) -> Set[str]:
+    """Normalized entity keys in text, e.g. 'phone:02993869933', 'area:3'"""
+    entities = set()
+
+    for phone in _find_phones(text):
+        entities.add(f"phone:{phone}")
+
+    text = unicodedata.normalize("NFC", text)
+    for address in _find_addresses(text):
+        entities.add(f"address:{address}")
+
+    for email in _EMAIL_RE.findall(text):
+        entities.add(f"email:{email.lower().strip('.')}")
+
+    folded = " ".join(fold_diacritics(text).lower().split())
+    for area in _AREA_RE.findall(folded):
+        entities.add(f"area:{int(area)}")
+    for province in _PROVINCE_RE.findall(folded):
+        entities.add(f"province:{'ho chi minh' if province == 'hcm' else province}")
+
+    return entities
+
+
+class EntityIndex:
+    """Hash index from normalized entities to the chunks that mention them.
+
+    Phone numbers (in any written format), emails, street / ward / commune
+    names, "khu vực N" areas and province names are extracted once at build
+    time, together with per-chunk flags used by result selection. At query
+    time only the query is parsed; chunk text is never scanned.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._flags: List[int] = []
+
+    def build(self, documents: Sequence[str]) -> None:
+        postings = defaultdict(set)
+        self._flags = []
+
+        for doc_id, text in enumerate(documents):
+            for entity in extract_entities(text):
+                postings[entity].add(doc_id)
+
+            flags = 0
+            if "|" in text or "Số TT" in text:
+                flags |= HAS_TABLE
+            if _CONTACT_RE.search(text):
+                flags |= HAS_CONTACT_INFO
+            if _ORGANIZATION_RE.search(text):
+                flags |= HAS_ORGANIZATIONAL_INFO
+            self._flags.append(flags)
+
+        self._postings = dict(postings)
+        logger.info(
+            f"🏷️ Entity index built: {len(self._postings)} entities over {len(documents)} chunks"
+        )
+
+    def lookup(self, query: str) -> Dict[str, Set[int]]:
+        """Chunks mentioning each entity found in the query"""
+        return {
+            entity: self._postings.get(entity, set())
+            for entity in extract_entities(query)
+        }
+
+    def has_flags(self, doc_id: int, flags: int) -> bool:
+        return 0 <= doc_id < len(self._flags) and bool(self._flags[doc_id] & flags)
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "format": ENTITY_INDEX_FORMAT,
+                    "postings": {entity: sorted(ids) for entity, ids in self._postings.items()},
+                    "flags": self._flags,
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    def load(self, path: str, num_docs: int) -> bool:
+        """Load an index saved by the same extraction rules for ``num_docs`` chunks"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != ENTITY_INDEX_FORMAT or len(data["flags"]) != num_docs:
+            return False
+        self._postings = {entity: set(ids) for entity, ids in data["postings"].items()}
+        self._flags = data["flags"]
+        return True
+
+
+def load_or_build_entity_index(
+    documents: Sequence[str], version: str, directory: Optional[str] = None
+) -> EntityIndex:
+    """Load the persisted entity index for this corpus version, or build it.
+
+    Saved as ``entities-<version>.json`` next to the embedding store, so
+    serving processes skip running the extraction regexes over the corpus.
+    """
+    index = EntityIndex()
+
+    path = None
+    if directory:
+        path = os.path.join(directory, f"entities-{version}.json")
+        if os.path.exists(path):
+            try:
+                if index.load(path, len(documents)):
+                    logger.info(f"✅ Loaded entity index from {path}")
+                    return index
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load entity index, rebuilding: {e}")
+
+    index.build(documents)
+
+    if path and os.access(directory, os.W_OK):
+        try:
+            tmp_path = os.path.join(directory, ".entities.tmp")
+            index.save(tmp_path)
+            os.replace(tmp_path, path)
+            for stale in glob.glob(os.path.join(directory, "entities-*")):
+                if stale != path:
+                    os.remove(stale)
+            logger.info(f"💾 Saved entity index to {path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save entity index: {e}")
+
+    return index
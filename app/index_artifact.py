@@ -0,0 +1,111 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    from .embedding_store import EmbeddingStore
+except ImportError:
+    from embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_FILENAME = "artifact.json"
+CHUNKS_FILENAME = "chunks.jsonl"
+
+
+def write_index_artifact(
+    output_dir: str,
+    chunks: List[Dict[str, Any]],
+    vectors,
+    model: str,
+    content_hash: str,
+    settings: Dict[str, Any],
+) -> EmbeddingStore:
+    """Write a self-contained index artifact: embedding store plus chunk texts.
+
+    ``chunks`` holds one dict per row of ``vectors`` with the chunk text under
+    ``content``, its cache key under ``key`` and the remaining chunk metadata.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    store = EmbeddingStore.save(
+        output_dir,
+        vectors,
+        model=model,
+        chunks=[
+            {name: value for name, value in chunk.items() if name != "content"}
+            for chunk in chunks
+        ],
+        content_hash=content_hash,
+    )
+
+    chunks_tmp = os.path.join(output_dir, f".{CHUNKS_FILENAME}.tmp")
+    with open(chunks_tmp, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    os.replace(chunks_tmp, os.path.join(output_dir, CHUNKS_FILENAME))
+
+    artifact = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "store_version": store.version,
+        "built_at": datetime.now().isoformat(),
+        "model": model,
+        "num_chunks": len(chunks),
+        "num_files": len({chunk["filename"] for chunk in chunks}),
+        "settings": settings,
+    }
+    artifact_tmp = os.path.join(output_dir, f".{ARTIFACT_FILENAME}.tmp")
+    with open(artifact_tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, indent=2)
+    os.replace(artifact_tmp, os.path.join(output_dir, ARTIFACT_FILENAME))
+
+    logger.info(f"📦 Wrote index artifact {store.version} to {output_dir}")
+    return store
+
+
+def load_index_artifact(
+    artifact_dir: str,
+) -> Optional[Tuple[Dict[str, Any], EmbeddingStore, List[Dict[str, Any]]]]:
+    """Load an index artifact read-only, or return None if it is missing or stale"""
+    artifact_path = os.path.join(artifact_dir, ARTIFACT_FILENAME)
+    if not os.path.exists(artifact_path):
+        return None
+
+    try:
+        with open(artifact_path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+
+        if artifact.get("format_version") != ARTIFACT_FORMAT_VERSION:
+            logger.warning(
+                f"⚠️ Index artifact format {artifact.get('format_version')} is not supported"
+            )
+            return None
+
+        store = EmbeddingStore.load(artifact_dir)
+        if store is None or store.version != artifact.get("store_version"):
+            logger.warning("⚠️ Index artifact embedding store is missing or mismatched")
+            return None
+
+        chunks = []
+        with open(os.path.join(artifact_dir, CHUNKS_FILENAME), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    chunks.append(json.loads(line))
+
+        if len(chunks) != store.count:
+            logger.warning(
+                f"⚠️ Index artifact has {len(chunks)} chunks but {store.count} vectors"
+            )
+            return None
+
+        logger.info(
+            f"📦 Loaded index artifact {store.version}: {len(chunks)} chunks from {artifact.get('num_files')} files"
+        )
+        return artifact, store, chunks
+
+    except Exception as e:
+        logger.error(f"❌ Error loading index artifact: {e}")
+        return None
@@ -0,0 +1,217 @@
+import os
+import re
+import glob
+import math
+import logging
+import unicodedata
+from collections import Counter, defaultdict
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Bumped whenever tokenization or weighting changes, invalidating saved indexes
+LEXICAL_INDEX_FORMAT = 2
+
+
+def fold_diacritics(text: str) -> str:
+    """Strip Vietnamese tone and vowel marks: 'Cần Thơ' -> 'Can Tho'"""
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+    return stripped.replace("đ", "d").replace("Đ", "D")
+
+
+def vietnamese_tokenize(
+    text: str, fold: bool = True, bigrams: bool = True, query: bool = False
+) -> List[str]:
+    """Tokenize Vietnamese text into syllables, folded variants and bigrams.
+
+    Vietnamese words are mostly multi-syllable ("viện kiểm sát"), so adjacent
+    syllable bigrams approximate word matches without a segmenter. With
+    ``fold`` an accented token also gets an unaccented ``~`` variant, so a
+    query typed without diacritics still matches. Tokens without diacritics
+    get none (it would duplicate their postings); instead a ``query`` looks
+    up both spellings of every token.
+    """
+    syllables = _WORD_RE.findall(unicodedata.normalize("NFC", text).lower())
+    tokens = list(syllables)
+    if bigrams:
+        tokens.extend(f"{a}_{b}" for a, b in zip(syllables, syllables[1:]))
+    if fold:
+        variants = []
+        for token in tokens:
+            folded = fold_diacritics(token)
+            if folded != token:
+                variants.append(f"~{folded}")
+                if query:
+                    variants.append(folded)
+            elif query:
+                variants.append(f"~{folded}")
+        tokens.extend(variants)
+    return tokens
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[int, float]]], k: int = 60
+) -> List[Tuple[int, float]]:
+    """Fuse ranked (id, score) lists by summing 1 / (k + rank)"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking):
+            fused[item_id] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over chunk texts.
+
+    Each term's postings are two arrays (document ids and precomputed BM25
+    term weights, idf included), so scoring a query is a handful of array
+    scatter-adds over the postings of its terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, fold: bool = True, bigrams: bool = True):
+        self.k1 = k1
+        self.b = b
+        self.fold = fold
+        self.bigrams = bigrams
+        self.num_docs = 0
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def tokenize(self, text: str, query: bool = False) -> List[str]:
+        return vietnamese_tokenize(text, fold=self.fold, bigrams=self.bigrams, query=query)
+
+    def build(self, documents: Sequence[str]) -> None:
+        """Index documents; document ids are their positions in the sequence"""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(len(documents), dtype=np.float32)
+
+        for doc_id, text in enumerate(documents):
+            counts = Counter(self.tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        self.num_docs = len(documents)
+        avg_length = float(lengths.mean()) if self.num_docs else 0.0
+        length_norm = self.k1 * (
+            1 - self.b + self.b * lengths / max(avg_length, 1e-9)
+        )
+
+        self._postings = {}
+        for term, entries in postings.items():
+            doc_ids = np.fromiter((d for d, _ in entries), dtype=np.int32, count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            df = len(entries)
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            weights = idf * tfs * (self.k1 + 1) / (tfs + length_norm[doc_ids])
+            self._postings[term] = (doc_ids, weights.astype(np.float32))
+
+        logger.info(
+            f"📚 BM25 index built: {self.num_docs} documents, {len(self._postings)} terms"
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(self.tokenize(query, query=True)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1])
+        return scores
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to top_k (document id, score) pairs with a positive score"""
+        if self.num_docs == 0 or top_k <= 0:
+            return []
+
+        scores = self.scores(query)
+        k = min(top_k, self.num_docs)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.num_docs else np.arange(k)
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top if scores[doc_id] > 0]
+
+    def save(self, path: str):
+        """Write the postings as one .npz: terms, CSR offsets, ids and weights"""
+        terms = list(self._postings)
+        sizes = [len(self._postings[term][0]) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        empty = np.zeros(0, dtype=np.float32)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                format=np.int64(LEXICAL_INDEX_FORMAT),
+                params=np.array([self.k1, self.b, self.fold, self.bigrams], dtype=np.float64),
+                num_docs=np.int64(self.num_docs),
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                doc_ids=np.concatenate([self._postings[t][0] for t in terms] or [empty.astype(np.int32)]),
+                weights=np.concatenate([self._postings[t][1] for t in terms] or [empty]),
+            )
+
+    def load(self, path: str, num_docs: int) -> bool:
+        """Load postings saved with the same settings for ``num_docs`` documents"""
+        with np.load(path) as data:
+            if (
+                int(data["format"]) != LEXICAL_INDEX_FORMAT
+                or int(data["num_docs"]) != num_docs
+                or list(data["params"]) != [self.k1, self.b, self.fold, self.bigrams]
+            ):
+                return False
+            terms, offsets = data["terms"].tolist(), data["offsets"]
+            doc_ids, weights = data["doc_ids"], data["weights"]
+
+        self.num_docs = num_docs
+        self._postings = {
+            term: (doc_ids[offsets[i]:offsets[i + 1]], weights[offsets[i]:offsets[i + 1]])
+            for i, term in enumerate(terms)
+        }
+        return True
+
+
+def load_or_build_lexical_index(
+    documents: Sequence[str],
+    version: str,
+    directory: Optional[str] = None,
+) -> BM25Index:
+    """Load the persisted BM25 index for this corpus version, or build it.
+
+    Saved as ``bm25-<version>.npz`` next to the embedding store, so serving
+    processes skip tokenizing the corpus. LEXICAL_FOLD_DIACRITICS and
+    LEXICAL_BIGRAMS must match the saved index, otherwise it is rebuilt.
+    """
+    index = BM25Index(
+        fold=os.getenv("LEXICAL_FOLD_DIACRITICS", "true").lower() == "true",
+        bigrams=os.getenv("LEXICAL_BIGRAMS", "true").lower() == "true",
+    )
+
+    path = None
+    if directory:
+        path = os.path.join(directory, f"bm25-{version}.npz")
+        if os.path.exists(path):
+            try:
+                if index.load(path, len(documents)):
+                    logger.info(f"✅ Loaded BM25 index from {path}")
+                    return index
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load BM25 index, rebuilding: {e}")
+
+    index.build(documents)
+
+    if path and os.access(directory, os.W_OK):
+        try:
+            tmp_path = os.path.join(directory, ".bm25.tmp")
+            index.save(tmp_path)
+            os.replace(tmp_path, path)
+            for stale in glob.glob(os.path.join(directory, "bm25-*")):
+                if stale != path:
+                    os.remove(stale)
+            logger.info(f"💾 Saved BM25 index to {path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save BM25 index: {e}")
+
+    return index
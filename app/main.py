@@ -9,6 +9,11 @@ import base64
 from werkzeug.utils import secure_filename
 import tempfile
 
+try:
+    from .sse import coalesce_tokens, encode_answer, sse_event, wants_event_stream
+except ImportError:
+    from sse import coalesce_tokens, encode_answer, sse_event, wants_event_stream
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,11 +31,21 @@ app = Flask(
 _current_rag_function = None
 _rag_function_name = None
 
+# Loader, readiness check and post-fork hook of the active RAG backend
+_rag_loader = None
+_rag_ready_check = None
+_rag_fork_hook = None
+_rag_stats = None
+_rag_warmup_error = None
+_rag_async_function = None
+
 
 # Lazy import function to avoid loading heavy dependencies on Vercel
 def get_rag_function():
     """Dynamically import the appropriate RAG function based on environment"""
     global _current_rag_function, _rag_function_name
+    global _rag_loader, _rag_ready_check, _rag_fork_hook, _rag_stats
+    global _rag_async_function
 
     # Return cached function if available
     if _current_rag_function is not None:
@@ -46,9 +61,21 @@ def get_rag_function():
         logger.info("🔧 Attempting to import Enhanced RAG...")
 
         try:
-            from .enhanced_rag_agent import get_enhanced_streaming_response
+            from .enhanced_rag_agent import (
+                get_enhanced_streaming_response,
+                get_enhanced_streaming_response_async,
+                get_enhanced_agent,
+                get_enhanced_agent_stats,
+                is_enhanced_agent_ready,
+                reset_enhanced_agent_client,
+            )
 
             logger.info("✅ Enhanced RAG imported successfully")
+            _rag_loader = get_enhanced_agent
+            _rag_ready_check = is_enhanced_agent_ready
+            _rag_fork_hook = reset_enhanced_agent_client
+            _rag_stats = get_enhanced_agent_stats
+            _rag_async_function = get_enhanced_streaming_response_async
             _current_rag_function = get_enhanced_streaming_response
             _rag_function_name = (
                 "Enhanced RAG (Vercel-optimized)" if is_vercel else "Enhanced RAG"
@@ -60,9 +87,21 @@ def get_rag_function():
 
             current_dir = os.path.dirname(os.path.abspath(__file__))
             sys.path.insert(0, current_dir)
-            from enhanced_rag_agent import get_enhanced_streaming_response
+            from enhanced_rag_agent import (
+                get_enhanced_streaming_response,
+                get_enhanced_streaming_response_async,
+                get_enhanced_agent,
+                get_enhanced_agent_stats,
+                is_enhanced_agent_ready,
+                reset_enhanced_agent_client,
+            )
 
             logger.info("✅ Enhanced RAG imported successfully (fallback path)")
+            _rag_loader = get_enhanced_agent
+            _rag_ready_check = is_enhanced_agent_ready
+            _rag_fork_hook = reset_enhanced_agent_client
+            _rag_stats = get_enhanced_agent_stats
+            _rag_async_function = get_enhanced_streaming_response_async
             _current_rag_function = get_enhanced_streaming_response
             _rag_function_name = (
                 "Enhanced RAG (Vercel-optimized fallback)"
@@ -79,15 +118,30 @@ def get_rag_function():
             logger.info("🔧 Falling back to Simple RAG...")
 
             try:
-                from .simple_rag_agent import get_simple_streaming_response
+                from .simple_rag_agent import (
+                    get_simple_streaming_response,
+                    get_simple_agent,
+                    is_simple_agent_ready,
+                    reset_simple_agent_client,
+                )
             except ImportError:
                 import sys
 
                 current_dir = os.path.dirname(os.path.abspath(__file__))
                 sys.path.insert(0, current_dir)
-                from simple_rag_agent import get_simple_streaming_response
+                from simple_rag_agent import (
+                    get_simple_streaming_response,
+                    get_simple_agent,
+                    is_simple_agent_ready,
+                    reset_simple_agent_client,
+                )
 
             logger.info("✅ Simple RAG imported successfully")
+            _rag_loader = get_simple_agent
+            _rag_ready_check = is_simple_agent_ready
+            _rag_fork_hook = reset_simple_agent_client
+            _rag_stats = None
+            _rag_async_function = None
             _current_rag_function = get_simple_streaming_response
             _rag_function_name = "Simple RAG (fallback)"
             return get_simple_streaming_response
@@ -95,11 +149,61 @@ def get_rag_function():
         except Exception as e2:
             logger.error(f"❌ Simple RAG also failed: {e2}")
             logger.info("🔄 Falling back to basic OpenAI response")
+            _rag_loader = _rag_ready_check = _rag_fork_hook = _rag_stats = None
+            _rag_async_function = None
             _current_rag_function = get_basic_openai_response()
             _rag_function_name = "Basic OpenAI (fallback)"
             return get_basic_openai_response()
 
 
+def get_async_rag_function():
+    """Async generator function of the active backend, or None if it has none"""
+    get_rag_function()
+    return _rag_async_function
+
+
+def warm_up_rag():
+    """Import the RAG backend and load its index before serving traffic.
+
+    Under gunicorn with preload_app this runs in the master, so forked
+    workers share the loaded index copy-on-write.
+    """
+    global _rag_warmup_error
+
+    logger.info("🔥 Warming up RAG system...")
+    try:
+        get_rag_function()
+        if _rag_loader is not None:
+            _rag_loader()
+        _rag_warmup_error = None
+        logger.info(f"✅ RAG system warm: {_rag_function_name}")
+    except Exception as e:
+        _rag_warmup_error = str(e)
+        logger.error(f"❌ RAG warm-up failed: {e}")
+
+
+def is_rag_ready() -> bool:
+    """Whether the active RAG backend has its index loaded"""
+    if _current_rag_function is None:
+        return False
+    if _rag_ready_check is None:
+        return True
+    return _rag_ready_check()
+
+
+def rag_readiness():
+    """(HTTP status, JSON body) of the readiness probe"""
+    if is_rag_ready():
+        return 200, {"ready": True, "rag_system": _rag_function_name}
+    return 503, {"ready": False, "error": _rag_warmup_error}
+
+
+def reset_rag_after_fork():
+    """Called in each gunicorn worker after fork to drop inherited connections"""
+    if _rag_fork_hook is not None:
+        _rag_fork_hook()
+
+
 def get_fallback_response():
     """Simple fallback response when RAG system is not available"""
 
@@ -133,27 +237,19 @@ def get_basic_openai_response():
             return
 
         try:
-            # Initialize client without proxies parameter to avoid compatibility issues
-            client = openai.OpenAI(api_key=api_key)
-        except TypeError as e:
-            if "proxies" in str(e):
-                logger.error(
-                    "❌ OpenAI client initialization failed due to proxies parameter"
-                )
-                # Try fallback initialization
-                try:
-                    client = openai.OpenAI(api_key=api_key)
-                except Exception:
-                    fallback = get_fallback_response()
-                    for chunk in fallback(question, conversation_history):
-                        yield chunk
-                    return
-            else:
-                logger.error(f"❌ OpenAI client initialization failed: {e}")
-                fallback = get_fallback_response()
-                for chunk in fallback(question, conversation_history):
-                    yield chunk
-                return
+            # Shared, pooled client: no new TCP/TLS handshake per question
+            try:
+                from .openai_client import get_openai_client
+            except ImportError:
+                from openai_client import get_openai_client
+
+            client = get_openai_client()
+        except Exception as e:
+            logger.error(f"❌ OpenAI client initialization failed: {e}")
+            fallback = get_fallback_response()
+            for chunk in fallback(question, conversation_history):
+                yield chunk
+            return
 
         try:
             response = client.chat.completions.create(
@@ -222,43 +318,61 @@ def ask():
         logger.error("❌ No question provided in request")
         return Response("Error: Question is required.", status=400)
 
-    def generate():
-        """
-        A generator function that yields Server-Sent Events for enhanced RAG.
-        """
-        try:
-            logger.info("🔄 Getting RAG function...")
-            rag_function = get_rag_function()
+    def answer_chunks():
+        """Raw answer deltas from the active RAG backend"""
+        logger.info("🔄 Getting RAG function...")
+        rag_function = get_rag_function()
+
+        # Log which RAG system is being used
+        logger.info(f"🤖 Using RAG system: {_rag_function_name}")
 
-            # Log which RAG system is being used
-            logger.info(f"🤖 Using RAG system: {_rag_function_name}")
+        if rag_function is None:
+            logger.error("❌ RAG function is not available.")
+            fallback_stream = get_fallback_response()
+            yield from fallback_stream(question, conversation_history)
+            return
+
+        logger.info("🔄 Starting RAG streaming...")
 
-            if rag_function is None:
-                logger.error("❌ RAG function is not available.")
-                fallback_stream = get_fallback_response()
-                for chunk in fallback_stream(question, conversation_history):
-                    sse_data = json.dumps({"token": chunk})
-                    yield f"data: {sse_data}\n\n"
-                return
+        # Check if rag_function is callable or needs to be called
+        if callable(rag_function):
+            stream = rag_function(question, conversation_history)
+        else:
+            # If it's already a generator, use it directly
+            stream = rag_function
 
-            logger.info("🔄 Starting RAG streaming...")
+        yield from stream
 
-            # Check if rag_function is callable or needs to be called
-            if callable(rag_function):
-                stream = rag_function(question, conversation_history)
-            else:
-                # If it's already a generator, use it directly
-                stream = rag_function
+    if not wants_event_stream(request.headers.get("Accept", "")):
+        # Non-SSE clients get the whole answer as (optionally gzipped) JSON
+        try:
+            answer = "".join(answer_chunks())
+        except Exception as e:
+            logger.error(f"❌ RAG error: {str(e)}")
+            return jsonify({"error": f"RAG error: {str(e)}"}), 500
+
+        body, content_encoding = encode_answer(
+            answer, request.headers.get("Accept-Encoding", "")
+        )
+        response = Response(body, mimetype="application/json")
+        response.headers["Vary"] = "Accept, Accept-Encoding"
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+        return response
 
-            for chunk in stream:
-                sse_data = json.dumps({"token": chunk})
-                yield f"data: {sse_data}\n\n"
+    def generate():
+        """
+        A generator function that yields Server-Sent Events for enhanced RAG.
+        Deltas are coalesced into larger frames (SSE_COALESCE_BYTES / _MS).
+        """
+        try:
+            for chunk in coalesce_tokens(answer_chunks()):
+                yield sse_event({"token": chunk})
 
         except Exception as e:
             logger.error(f"❌ RAG streaming error: {str(e)}")
             # Send error message if RAG fails
-            error_data = json.dumps({"error": f"RAG error: {str(e)}"})
-            yield f"data: {error_data}\n\n"
+            yield sse_event({"error": f"RAG error: {str(e)}"})
 
     # Return a streaming response
     logger.info("📡 Returning SSE response stream")
@@ -285,6 +399,13 @@ def reload_rag():
     }
 
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 only once the RAG index is loaded in this worker"""
+    status_code, payload = rag_readiness()
+    return jsonify(payload), status_code
+
+
 @app.route("/status", methods=["GET"])
 def status():
     """Get current system status and RAG configuration"""
@@ -303,12 +424,17 @@ def status():
 
     data_path = os.path.join(project_root, "data")
     rules_path = os.path.join(project_root, "raw_data", "rules.txt")
-    cache_path = os.path.join(current_dir, ".cache", "embeddings_cache.pkl")
+    cache_path = os.path.join(current_dir, ".cache", "embeddings", "manifest.json")
 
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "rag_system": {"active": rag_info, "cached": _current_rag_function is not None},
+        "rag_system": {
+            "active": rag_info,
+            "cached": _current_rag_function is not None,
+            "ready": is_rag_ready(),
+            "caches": _rag_stats() if _rag_stats is not None else {},
+        },
         "environment": {
             "vercel": is_vercel,
             "has_openai_key": has_openai_key,
@@ -328,7 +454,9 @@ def status():
             else "not_active",
             "simple_rag": "fallback_available",
             "embeddings": "openai_text_embedding_3_small",
-            "chunking": "overlap_based",
+            "chunking": "overlap_based"
+            if os.getenv("CHUNKER", "markdown").lower() == "window"
+            else "markdown_legal_headings",
             "reranking": "multi_factor",
         },
     }
@@ -516,8 +644,8 @@ if __name__ == "__main__":
     logger.info("🚀 Starting Flask application...")
     logger.info("🔄 Pre-loading RAG function...")
 
-    # Pre-load RAG function to show which one is being used
-    rag_func = get_rag_function()
+    # Pre-load RAG function and index so the first request is served warm
+    warm_up_rag()
     logger.info(f"✅ Pre-loaded RAG system: {_rag_function_name}")
 
     app.run(debug=True, host="0.0.0.0", port=5001)
@@ -0,0 +1,161 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from .tokens import count_tokens, CHARS_PER_TOKEN
+except ImportError:
+    from tokens import count_tokens, CHARS_PER_TOKEN
+
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# "Chương II", "Mục 3", "Điều 12." - optionally bold; levels sit below markdown headings
+_LEGAL_HEADING_RE = re.compile(
+    r"^(?:\*\*)?\s*(Chương|Mục|Điều)\s+([0-9]+|[IVXLC]+)\b", re.IGNORECASE
+)
+_LEGAL_LEVELS = {"chương": 7, "mục": 8, "điều": 9}
+# Khoản ("1.") and điểm ("a)") start a preferred split point but not a new section
+_CLAUSE_RE = re.compile(r"^(?:\d{1,3}\.|[a-zđ]\))\s")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{3,}")
+
+
+class MarkdownSection(NamedTuple):
+    """One chunk of a markdown file with its position and heading path"""
+
+    content: str
+    start_char: int
+    end_char: int
+    heading_path: List[str]
+
+
+class MarkdownChunker:
+    """Structure-aware chunker for markdown and Vietnamese legal documents.
+
+    Files are read line by line. A markdown heading or a Chương/Mục/Điều line
+    always starts a new chunk, and a section longer than ``max_tokens`` is split
+    at the last paragraph, khoản or điểm boundary that fits. Tables are never
+    split unless a single table exceeds the budget, in which case each piece
+    repeats the table header. Lines longer than the budget are cut into
+    character windows as a last resort.
+    """
+
+    def __init__(self, max_tokens: int = 800):
+        self.max_tokens = max_tokens
+
+    def split_file(self, file_path: str) -> Iterator[MarkdownSection]:
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield from self.split_lines(f)
+
+    def split_text(self, text: str) -> Iterator[MarkdownSection]:
+        yield from self.split_lines(text.splitlines(keepends=True))
+
+    def split_lines(self, lines: Iterable[str]) -> Iterator[MarkdownSection]:
+        headings: List[Tuple[int, str]] = []
+        # Pending chunk: (line, start offset, tokens) plus bookkeeping
+        current: List[Tuple[str, int, int]] = []
+        tokens = 0
+        has_body = False
+        soft_break = 0  # index in current of the last preferred split point
+        lead = 0  # heading lines at the front of current, kept with their body
+        table_header: Optional[List[Tuple[str, int, int]]] = None
+        table_start = 0
+        offset = 0
+
+        def emit(count: int) -> Iterator[MarkdownSection]:
+            nonlocal current, tokens, soft_break, table_start, lead
+            emitted, current = current[:count], current[count:]
+            tokens = sum(t for _, _, t in current)
+            soft_break = 0
+            table_start = max(table_start - count, 0)
+            lead = max(lead - count, 0)
+            content = "".join(line for line, _, _ in emitted).strip()
+            if content:
+                start = emitted[0][1]
+                end = emitted[-1][1] + len(emitted[-1][0])
+                yield MarkdownSection(
+                    content, start, end, [title for _, title in headings]
+                )
+
+        for line in lines:
+            line_start, offset = offset, offset + len(line)
+            stripped = line.strip()
+            line_tokens = count_tokens(line)
+
+            heading = self._heading(stripped)
+            if heading is not None:
+                if has_body:
+                    yield from emit(len(current))
+                    has_body = False
+                level, title = heading
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, title))
+                table_header = None
+                current.append((line, line_start, line_tokens))
+                tokens += line_tokens
+                lead = len(current)
+                continue
+
+            is_table_row = stripped.startswith("|")
+            if is_table_row and table_header is None:
+                # A table starts: keep it together with what follows if possible
+                table_header = [(line, line_start, line_tokens)]
+                table_start = soft_break = len(current)
+            elif is_table_row and len(table_header) == 1 and _TABLE_SEPARATOR_RE.match(stripped):
+                table_header.append((line, line_start, line_tokens))
+            elif not is_table_row:
+                table_header = None
+                if not stripped or _CLAUSE_RE.match(stripped):
+                    soft_break = len(current)
+
+            if line_tokens > self.max_tokens:
+                yield from emit(len(current))
+                for piece_start, piece in self._split_long_line(line, line_start):
+                    yield MarkdownSection(
+                        piece.strip(),
+                        piece_start,
+                        piece_start + len(piece),
+                        [title for _, title in headings],
+                    )
+                has_body = False
+                continue
+
+            while current and tokens + line_tokens > self.max_tokens:
+                if is_table_row and table_header is not None and table_start <= lead:
+                    # The table alone overflows: continue it under a repeated header
+                    yield from emit(len(current))
+                    header_tokens = sum(t for _, _, t in table_header)
+                    if (
+                        not _TABLE_SEPARATOR_RE.match(stripped)
+                        and header_tokens + line_tokens <= self.max_tokens
+                    ):
+                        current = [(h, line_start, t) for h, _, t in table_header]
+                        tokens = header_tokens
+                    break
+                yield from emit(soft_break if soft_break > lead else len(current))
+
+            current.append((line, line_start, line_tokens))
+            tokens += line_tokens
+            if stripped:
+                has_body = True
+
+        yield from emit(len(current))
+
+    @staticmethod
+    def _heading(stripped: str) -> Optional[Tuple[int, str]]:
+        match = _MD_HEADING_RE.match(stripped)
+        if match:
+            return len(match.group(1)), match.group(2).strip("* ")
+        match = _LEGAL_HEADING_RE.match(stripped)
+        if match:
+            return _LEGAL_LEVELS[match.group(1).lower()], stripped.strip("*# ")
+        return None
+
+    def _split_long_line(self, line: str, line_start: int) -> Iterator[Tuple[int, str]]:
+        """Cut a line over the token budget into windows that fit it"""
+        window = max(int(self.max_tokens * CHARS_PER_TOKEN), 1)
+        start = 0
+        while start < len(line):
+            size = window
+            while size > 1 and count_tokens(line[start:start + size]) > self.max_tokens:
+                size //= 2
+            yield line_start + start, line[start:start + size]
+            start += size
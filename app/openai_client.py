@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+from typing import Optional
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+except ImportError:
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _http_options() -> dict:
+    """Connection pool settings shared by the sync and async clients"""
+    http2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true" and h2 is not None
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "timeout": httpx.Timeout(
+            float(os.getenv("OPENAI_TIMEOUT", "120")),
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10")),
+        ),
+    }
+
+
+def _client_options() -> dict:
+    if openai is None:
+        raise ImportError("OpenAI package is required but not installed")
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is required")
+
+    return {
+        "api_key": api_key,
+        "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    }
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Rate limits, timeouts, connection drops and 5xx responses are worth retrying"""
+    if openai is None:
+        return False
+    if isinstance(
+        error,
+        (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError),
+    ):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server's Retry-After hint, if the error carries one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_openai_client():
+    """Process-wide OpenAI client with a keep-alive connection pool.
+
+    Every module shares it, so requests reuse warm TCP/TLS connections to
+    the API instead of opening new ones per client. The httpx client is
+    thread-safe.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = _client_options()
+                http_options = _http_options() if httpx is not None else None
+                if http_options is not None:
+                    options["http_client"] = openai.DefaultHttpxClient(**http_options)
+                _client = openai.OpenAI(**options)
+                logger.info(
+                    f"🔌 Shared OpenAI client created (HTTP/2: {bool(http_options and http_options['http2'])})"
+                )
+    return _client
+
+
+def get_async_openai_client():
+    """Process-wide AsyncOpenAI client; use from a single event loop"""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                options = _client_options()
+                if httpx is not None:
+                    options["http_client"] = openai.DefaultAsyncHttpxClient(
+                        **_http_options()
+                    )
+                _async_client = openai.AsyncOpenAI(**options)
+                logger.info("🔌 Shared async OpenAI client created")
+    return _async_client
+
+
+def reset_openai_clients():
+    """Forget the shared clients so the next call opens fresh connections.
+
+    Runs automatically in forked children: pooled sockets inherited from the
+    parent must not be shared between processes.
+    """
+    global _client, _async_client, _client_lock
+    _client = None
+    _async_client = None
+    # The lock may have been held by another thread at fork time
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_openai_clients)
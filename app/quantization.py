@@ -0,0 +1,311 @@
+import os
+import glob
+import logging
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .vector_index import normalize_rows
+except ImportError:
+    from vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_KINDS = ("none", "fp16", "int8", "pq", "truncate")
+
+_BLOCK_ROWS = 16384
+# Codes are widened in blocks small enough to stay in cache for the matmul
+_SCORE_BLOCK_ROWS = 128
+
+
+def _save_arrays(base: str, arrays: dict):
+    """Write each array to ``<base>.<name>.npy``; codes last, marking a complete save"""
+    for name in sorted(arrays, key=lambda name: name == "codes"):
+        tmp_path = f"{base}.{name}.tmp.npy"
+        np.save(tmp_path, arrays[name])
+        os.replace(tmp_path, f"{base}.{name}.npy")
+
+
+def _load_array(base: str, name: str) -> np.ndarray:
+    # Memory-mapped: every worker process shares the page cache copy
+    return np.load(f"{base}.{name}.npy", mmap_mode="r")
+
+
+class ScalarQuantizer:
+    """float16 or int8 copy of a normalized matrix.
+
+    int8 codes use one symmetric scale per row, so a score is the dot product
+    of the codes with the float32 query times the row scale. Codes are
+    widened into a small reused float32 buffer and scored with BLAS; this
+    beat both an int32-accumulating einsum and NumPy's unaccelerated
+    float16 matmul. fp16 widening is much slower than int8's, so fp16 saves
+    memory but not time.
+    """
+
+    def __init__(self, kind: str = "int8"):
+        if kind not in ("fp16", "int8"):
+            raise ValueError(f"Unsupported scalar quantization {kind!r}")
+        self.kind = kind
+        self.codes: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None  # (count,) int8 row scales
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def build(self, matrix: np.ndarray):
+        count, dim = matrix.shape
+        if self.kind == "fp16":
+            self.codes = np.empty((count, dim), dtype=np.float16)
+            for start in range(0, count, _BLOCK_ROWS):
+                self.codes[start:start + _BLOCK_ROWS] = matrix[start:start + _BLOCK_ROWS]
+            return
+
+        self.codes = np.empty((count, dim), dtype=np.int8)
+        self.scale = np.empty(count, dtype=np.float32)
+        for start in range(0, count, _BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            peak = np.abs(block).max(axis=1)
+            scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            self.codes[start:start + len(block)] = np.clip(
+                np.rint(block / scale[:, None]), -127, 127
+            )
+            self.scale[start:start + len(block)] = scale
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every stored row"""
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        buffer = np.empty((_SCORE_BLOCK_ROWS, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), _SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + _SCORE_BLOCK_ROWS]
+            rows = buffer[: len(block)]
+            np.copyto(rows, block)
+            np.dot(rows, query_vector, out=scores[start:start + len(block)])
+        if self.scale is not None:
+            scores *= self.scale
+        return scores
+
+    def save(self, base: str):
+        arrays = {"codes": self.codes}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        _save_arrays(base, arrays)
+
+    def load(self, base: str, count: int, dim: int) -> bool:
+        codes = _load_array(base, "codes")
+        scale = _load_array(base, "scale") if self.kind == "int8" else None
+        if codes.shape != (count, dim) or (scale is not None and scale.shape != (count,)):
+            return False
+        self.codes, self.scale = codes, scale
+        return True
+
+
+class TruncatedQuantizer:
+    """First ``dim`` dimensions of every vector, renormalized.
+
+    text-embedding-3 models are trained so that a prefix of the embedding is
+    itself a usable embedding (asking the API for ``dimensions=256`` returns
+    exactly this), so the coarse pass needs no extra API calls and reads
+    ``dim / full_dim`` of the memory per query.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.kind = f"truncate{dim}"
+        self.codes: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def build(self, matrix: np.ndarray):
+        count = matrix.shape[0]
+        self.dim = min(self.dim, matrix.shape[1])
+        self.codes = np.empty((count, self.dim), dtype=np.float32)
+        for start in range(0, count, _BLOCK_ROWS):
+            self.codes[start:start + _BLOCK_ROWS] = normalize_rows(
+                matrix[start:start + _BLOCK_ROWS, : self.dim]
+            )
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Similarity of the truncated query to every truncated row"""
+        return self.codes @ normalize_rows(query_vector[: self.dim])[0]
+
+    def save(self, base: str):
+        _save_arrays(base, {"codes": self.codes})
+
+    def load(self, base: str, count: int, dim: int) -> bool:
+        codes = _load_array(base, "codes")
+        if codes.shape != (count, min(self.dim, dim)):
+            return False
+        self.codes = codes
+        return True
+
+
+class ProductQuantizer:
+    """Product quantization: each vector becomes ``subspaces`` one-byte codes.
+
+    The dimensions are split into equal sub-vectors, each replaced by the id
+    of its nearest of 256 k-means centroids. A query precomputes its dot
+    product with every centroid (asymmetric distance), so scoring a row is
+    ``subspaces`` table lookups. 1536-d float32 vectors shrink from 6 KB to
+    96 bytes with the default of 96 subspaces.
+    """
+
+    kind = "pq"
+
+    def __init__(self, subspaces: int = 96, iterations: int = 10, seed: int = 0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None  # (subspaces, 256, sub_dim)
+        self.codes: Optional[np.ndarray] = None  # (count, subspaces) uint8
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.centroids.nbytes
+
+    def _kmeans(self, data: np.ndarray, rng) -> np.ndarray:
+        k = min(256, len(data))
+        centroids = data[rng.choice(len(data), k, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self._assign(data, centroids)
+            sizes = np.bincount(assignment, minlength=k)
+            filled = sizes > 0
+            # Per-centroid sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(assignment, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[filled]
+            sums = np.add.reduceat(data[order], starts, axis=0)
+            centroids[filled] = sums / sizes[filled, None]
+        if k < 256:
+            centroids = np.vstack([centroids, np.repeat(centroids[:1], 256 - k, axis=0)])
+        return centroids.astype(np.float32)
+
+    @staticmethod
+    def _assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2)
+        return np.argmax(
+            2 * data @ centroids.T - np.sum(centroids ** 2, axis=1), axis=1
+        ).astype(np.uint8)
+
+    def build(self, matrix: np.ndarray):
+        count, dim = matrix.shape
+        # Largest number of subspaces not above the setting that divides dim
+        subspaces = next(m for m in range(min(self.subspaces, dim), 0, -1) if dim % m == 0)
+        self.subspaces = subspaces
+        sub_dim = dim // subspaces
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(count, 256 * 40)
+        sample = np.asarray(matrix[np.sort(rng.choice(count, sample_size, replace=False))])
+        sample = sample.reshape(sample_size, subspaces, sub_dim)
+        self.centroids = np.stack(
+            [self._kmeans(sample[:, j], rng) for j in range(subspaces)]
+        )
+
+        self.codes = np.empty((count, subspaces), dtype=np.uint8)
+        for start in range(0, count, _BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _BLOCK_ROWS])
+            block = block.reshape(len(block), subspaces, sub_dim)
+            for j in range(subspaces):
+                self.codes[start:start + len(block), j] = self._assign(
+                    block[:, j], self.centroids[j]
+                )
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every stored row"""
+        sub_queries = query_vector.reshape(self.subspaces, -1)
+        table = np.einsum("msd,md->ms", self.centroids, sub_queries).ravel()
+        offsets = np.arange(self.subspaces, dtype=np.int64) * 256
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), _BLOCK_ROWS):
+            block = self.codes[start:start + _BLOCK_ROWS]
+            scores[start:start + len(block)] = table[block + offsets].sum(axis=1)
+        return scores
+
+    def save(self, base: str):
+        _save_arrays(base, {"centroids": self.centroids, "codes": self.codes})
+
+    def load(self, base: str, count: int, dim: int) -> bool:
+        centroids = np.load(f"{base}.centroids.npy")
+        codes = _load_array(base, "codes")
+        if len(codes) != count or centroids.shape[0] * centroids.shape[2] != dim:
+            return False
+        self.centroids, self.codes = centroids, codes
+        self.subspaces = centroids.shape[0]
+        return True
+
+
+def create_quantizer(kind: str):
+    """Quantizer for VECTOR_QUANTIZATION, or None to search float32 directly"""
+    kind = kind.lower()
+    if kind not in QUANTIZATION_KINDS:
+        raise ValueError(
+            f"Unknown vector quantization {kind!r}, expected one of {QUANTIZATION_KINDS}"
+        )
+    if kind == "none":
+        return None
+    if kind == "pq":
+        return ProductQuantizer(subspaces=int(os.getenv("PQ_SUBSPACES", "96")))
+    if kind == "truncate":
+        return TruncatedQuantizer(dim=int(os.getenv("COARSE_DIM", "256")))
+    return ScalarQuantizer(kind)
+
+
+def load_or_build_quantizer(
+    matrix: np.ndarray,
+    version: str,
+    directory: Optional[str] = None,
+    kind: Optional[str] = None,
+    ann_active: bool = False,
+):
+    """Load the persisted codes for this matrix version, or encode the matrix.
+
+    Codes are saved as ``quant-<kind>-<version>.<array>.npy`` next to the
+    embedding store and memory-mapped on load; files for older versions are
+    removed on save. Returns None when ``ann_active``: the ANN index proposes
+    the candidates and rescores them against float32 rows itself, so codes
+    would never be read.
+    """
+    count, dim = matrix.shape
+    quantizer = create_quantizer(kind or os.getenv("VECTOR_QUANTIZATION", "none"))
+    if quantizer is None or count == 0:
+        return None
+    if ann_active:
+        logger.warning(
+            f"⚠️ VECTOR_QUANTIZATION={quantizer.kind} ignored: the ANN index serves "
+            f"this corpus ({count} vectors); raise ANN_MIN_SIZE or set ANN_BACKEND=exact to use it"
+        )
+        return None
+
+    base = None
+    if directory:
+        base = os.path.join(directory, f"quant-{quantizer.kind}-{version}")
+        if os.path.exists(f"{base}.codes.npy"):
+            try:
+                if quantizer.load(base, count, dim):
+                    logger.info(f"✅ Loaded {quantizer.kind} vector codes from {base}.*.npy")
+                    return quantizer
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load vector codes, re-encoding: {e}")
+
+    quantizer.build(matrix)
+    logger.info(
+        f"🗜️ Encoded {count} vectors as {quantizer.kind}: "
+        f"{quantizer.nbytes / 1e6:.1f} MB ({count * dim * 4 / max(quantizer.nbytes, 1):.0f}x smaller than float32)"
+    )
+
+    if base and os.access(directory, os.W_OK):
+        try:
+            quantizer.save(base)
+            for stale in glob.glob(os.path.join(directory, f"quant-{quantizer.kind}-*")):
+                if not os.path.basename(stale).startswith(os.path.basename(base) + "."):
+                    os.remove(stale)
+            # Serve from the mapped files rather than the freshly built arrays
+            quantizer.load(base, count, dim)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save vector codes: {e}")
+
+    return quantizer
@@ -0,0 +1,161 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a question for cache lookups"""
+    text = unicodedata.normalize("NFC", text).lower()
+    text = " ".join(text.split())
+    return text.strip(" ?!.,;:")
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings with TTL expiry and hit/miss counters.
+
+    Entries are keyed by (model, normalized query). An optional SQLite file
+    acts as a second tier shared by all worker processes on the machine, so
+    a question embedded by one worker is a cache hit in the others.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl_seconds: float = 24 * 3600,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """SQLite connection for this process; connections must not cross a fork"""
+        if not self.sqlite_path:
+            return None
+        if self._db_pid != os.getpid():
+            self._db_pid = os.getpid()
+            self._open_db(self.sqlite_path)
+        return self._db
+
+    def _open_db(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"🗄️ Query embedding cache backed by {path}")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Query cache database unavailable, using memory only: {e}")
+            self._db = None
+
+    @staticmethod
+    def _key(model: str, query: str) -> str:
+        return f"{model}\n{normalize_query(query)}"
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _get_from_db(self, db: sqlite3.Connection, key: str) -> Optional[np.ndarray]:
+        try:
+            row = db.execute(
+                "SELECT created, vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Query cache read failed: {e}")
+            return None
+
+        if row is None or self._expired(row[0]):
+            return None
+        self._remember(key, row[0], np.frombuffer(row[1], dtype=np.float32))
+        return self._entries[key][1]
+
+    def _remember(self, key: str, created: float, vector: np.ndarray):
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, model: str, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding, or None on a miss"""
+        key = self._key(model, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            db = self._connection()
+            if db is not None:
+                vector = self._get_from_db(db, key)
+                if vector is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, vector) -> None:
+        """Cache an embedding in memory and, if configured, on disk"""
+        key = self._key(model, query)
+        vector = np.asarray(vector, dtype=np.float32)
+        created = time.time()
+
+        with self._lock:
+            self._remember(key, created, vector)
+
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (key, created, vector) "
+                        "VALUES (?, ?, ?)",
+                        (key, created, vector.tobytes()),
+                    )
+                    if self.ttl_seconds > 0:
+                        db.execute(
+                            "DELETE FROM query_embeddings WHERE created < ?",
+                            (created - self.ttl_seconds,),
+                        )
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Query cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /status"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "shared_tier": self.sqlite_path if self._db is not None else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,96 @@
+import json
+import math
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RelevanceGate:
+    """Local relevance decision from the query embedding and retrieval scores.
+
+    By default the decision is two thresholds on the best chunk similarity:
+    at or above ``relevant_threshold`` the question is relevant, below
+    ``irrelevant_threshold`` it is not, and anything in between is uncertain.
+    If a logistic model file is given, its probability is used instead with
+    ``relevant_probability`` / ``irrelevant_probability`` as the band.
+
+    The model file is JSON: ``{"feature_weights": [w_top1, w_top3_mean],
+    "bias": b}`` with an optional ``"embedding_weights"`` list applied to the
+    normalized query embedding.
+    """
+
+    def __init__(
+        self,
+        relevant_threshold: float = 0.45,
+        irrelevant_threshold: float = 0.25,
+        model_path: Optional[str] = None,
+        relevant_probability: float = 0.8,
+        irrelevant_probability: float = 0.2,
+    ):
+        self.relevant_threshold = relevant_threshold
+        self.irrelevant_threshold = irrelevant_threshold
+        self.relevant_probability = relevant_probability
+        self.irrelevant_probability = irrelevant_probability
+        self.model = self._load_model(model_path) if model_path else None
+
+    @staticmethod
+    def _load_model(model_path: str) -> Optional[dict]:
+        try:
+            with open(model_path, "r", encoding="utf-8") as f:
+                model = json.load(f)
+            model["feature_weights"] = np.asarray(model["feature_weights"], dtype=np.float32)
+            if model.get("embedding_weights") is not None:
+                model["embedding_weights"] = np.asarray(
+                    model["embedding_weights"], dtype=np.float32
+                )
+            logger.info(f"✅ Loaded relevance model from {model_path}")
+            return model
+        except Exception as e:
+            logger.error(f"❌ Could not load relevance model, using thresholds: {e}")
+            return None
+
+    def _probability(self, query_vector: np.ndarray, features: np.ndarray) -> float:
+        logit = float(features @ self.model["feature_weights"]) + float(
+            self.model.get("bias", 0.0)
+        )
+        embedding_weights = self.model.get("embedding_weights")
+        if embedding_weights is not None and embedding_weights.shape == query_vector.shape:
+            norm = np.linalg.norm(query_vector)
+            logit += float(query_vector @ embedding_weights) / norm
+        return 1.0 / (1.0 + math.exp(-logit))
+
+    def decide(
+        self, query_vector, top_scores: List[float]
+    ) -> Optional[Tuple[bool, float, str]]:
+        """Return (relevant, confidence, reasoning), or None when uncertain"""
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if not top_scores or not np.any(query_vector):
+            # No usable embedding or an empty index: let the LLM decide
+            return None
+
+        top1 = top_scores[0]
+        top3_mean = float(np.mean(top_scores[:3]))
+
+        if self.model is not None:
+            probability = self._probability(
+                query_vector, np.array([top1, top3_mean], dtype=np.float32)
+            )
+            if probability >= self.relevant_probability:
+                return True, probability, f"Relevance model p={probability:.2f}"
+            if probability <= self.irrelevant_probability:
+                return False, 1.0 - probability, f"Relevance model p={probability:.2f}"
+            return None
+
+        # Confidence grows with the distance from the uncertain band
+        if top1 >= self.relevant_threshold:
+            confidence = min(1.0, 0.5 + (top1 - self.relevant_threshold) * 2)
+            reasoning = f"Top document similarity {top1:.3f} ≥ {self.relevant_threshold}"
+            return True, confidence, reasoning
+        if top1 < self.irrelevant_threshold:
+            confidence = min(1.0, 0.5 + (self.irrelevant_threshold - top1) * 2)
+            reasoning = f"Top document similarity {top1:.3f} < {self.irrelevant_threshold}"
+            return False, confidence, reasoning
+        return None
@@ -22,6 +22,11 @@ try:
 except ImportError:
     openai = None
 
+try:
+    from .openai_client import get_openai_client, reset_openai_clients
+except ImportError:
+    from openai_client import get_openai_client, reset_openai_clients
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -52,31 +57,11 @@ class SimpleRAGAgent:
             logger.error("❌ OPENAI_API_KEY not found in environment variables")
             raise ValueError("OPENAI_API_KEY is required")
 
-        # Initialize OpenAI client with error handling for compatibility issues
+        # Shared, pooled OpenAI client (see openai_client)
         self.client = None
         try:
-            # Try initialization without any extra parameters first
-            self.client = openai.OpenAI(api_key=api_key)
+            self.client = get_openai_client()
             logger.info("✅ OpenAI client initialized successfully")
-        except TypeError as e:
-            if "proxies" in str(e):
-                logger.error(
-                    "❌ OpenAI client failed due to proxies parameter - trying alternative initialization"
-                )
-                try:
-                    # Alternative initialization approach
-                    self.client = openai.OpenAI(api_key=api_key)
-                    logger.info("✅ OpenAI client initialized with alternative method")
-                except Exception as alt_e:
-                    logger.error(
-                        f"❌ Alternative OpenAI initialization also failed: {alt_e}"
-                    )
-                    raise RuntimeError(f"Cannot initialize OpenAI client: {alt_e}")
-            else:
-                logger.error(
-                    f"❌ OpenAI client initialization failed with TypeError: {e}"
-                )
-                raise
         except Exception as e:
             logger.error(f"❌ Failed to initialize OpenAI client: {e}")
             raise
@@ -474,6 +459,18 @@ def get_simple_agent():
     return _simple_agent
 
 
+def is_simple_agent_ready() -> bool:
+    """Whether the agent is loaded, without triggering a load"""
+    return _simple_agent is not None
+
+
+def reset_simple_agent_client():
+    """Give a forked worker its own OpenAI client instead of the master's"""
+    if _simple_agent is not None:
+        reset_openai_clients()
+        _simple_agent.client = get_openai_client()
+
+
 def get_simple_streaming_response(
     question: str, conversation_history: List[Dict[str, str]] = None
 ):
@@ -0,0 +1,135 @@
+"""Server-sent event framing for /ask, with token coalescing.
+
+OpenAI streams deltas of one or two characters; sending each as its own SSE
+frame costs a JSON encode, a write and frame overhead per character. The
+coalescers below buffer deltas and flush once ``max_bytes`` are pending or
+the oldest pending delta is ``max_delay`` seconds old.
+"""
+
+import os
+import json
+import gzip
+import time
+import asyncio
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+
+def coalesce_settings():
+    """(max_bytes, max_delay) from SSE_COALESCE_BYTES / SSE_COALESCE_MS; 0 disables"""
+    return (
+        int(os.getenv("SSE_COALESCE_BYTES", "64")),
+        float(os.getenv("SSE_COALESCE_MS", "30")) / 1000.0,
+    )
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def coalesce_tokens(
+    chunks: Iterable[str], max_bytes: Optional[int] = None, max_delay: Optional[float] = None
+) -> Iterator[str]:
+    """Merge small deltas from a blocking stream.
+
+    A blocking iterator cannot be interrupted by a timer, so the age check
+    runs when the next delta arrives; with the API's steady token rate that
+    keeps pieces within a few tens of milliseconds.
+    """
+    default_bytes, default_delay = coalesce_settings()
+    max_bytes = default_bytes if max_bytes is None else max_bytes
+    max_delay = default_delay if max_delay is None else max_delay
+
+    if max_bytes <= 0:
+        yield from chunks
+        return
+
+    pending = []
+    pending_bytes = 0
+    started = 0.0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if not pending:
+            started = time.monotonic()
+        pending.append(chunk)
+        pending_bytes += len(chunk.encode("utf-8"))
+        if pending_bytes >= max_bytes or time.monotonic() - started >= max_delay:
+            yield "".join(pending)
+            pending, pending_bytes = [], 0
+
+    if pending:
+        yield "".join(pending)
+
+
+async def acoalesce_tokens(
+    chunks: AsyncIterator[str], max_bytes: Optional[int] = None, max_delay: Optional[float] = None
+) -> AsyncIterator[str]:
+    """Merge small deltas from an async stream, flushing on a real timer"""
+    default_bytes, default_delay = coalesce_settings()
+    max_bytes = default_bytes if max_bytes is None else max_bytes
+    max_delay = default_delay if max_delay is None else max_delay
+
+    iterator = chunks.__aiter__()
+    if max_bytes <= 0:
+        async for chunk in iterator:
+            yield chunk
+        return
+
+    pending = []
+    pending_bytes = 0
+    deadline = None
+    next_chunk = None
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+
+            if not done:
+                # Timer expired with the next delta still on its way
+                yield "".join(pending)
+                pending, pending_bytes, deadline = [], 0, None
+                continue
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_chunk = None
+
+            if not chunk:
+                continue
+            if not pending:
+                deadline = time.monotonic() + max_delay
+            pending.append(chunk)
+            pending_bytes += len(chunk.encode("utf-8"))
+            if pending_bytes >= max_bytes:
+                yield "".join(pending)
+                pending, pending_bytes, deadline = [], 0, None
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+
+    if pending:
+        yield "".join(pending)
+
+
+def wants_event_stream(accept: str) -> bool:
+    """SSE unless the client explicitly asks for JSON (e.g. API callers)"""
+    accept = (accept or "").lower()
+    return "application/json" not in accept or "text/event-stream" in accept
+
+
+def encode_answer(answer: str, accept_encoding: str):
+    """JSON body for non-SSE clients, gzipped when accepted and worth it.
+
+    Returns (body, content_encoding or None). ANSWER_GZIP=false disables it.
+    """
+    body = json.dumps({"answer": answer}, ensure_ascii=False).encode("utf-8")
+    gzip_enabled = os.getenv("ANSWER_GZIP", "true").lower() == "true"
+    min_bytes = int(os.getenv("ANSWER_GZIP_MIN_BYTES", "500"))
+    if gzip_enabled and len(body) >= min_bytes and "gzip" in (accept_encoding or "").lower():
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
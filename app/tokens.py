@@ -0,0 +1,50 @@
+import math
+import logging
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# gpt-4.1-mini / gpt-5 prompts are counted with o200k_base; text-embedding-3
+# inputs (and their 8191-token limit) with cl100k_base
+PROMPT_ENCODING = "o200k_base"
+EMBEDDING_ENCODING = "cl100k_base"
+
+# Used when tiktoken or its BPE files are unavailable. Vietnamese diacritics
+# cost extra tokens, cl100k_base far more than o200k_base; the ratios err
+# towards overcounting so token budgets still hold
+_FALLBACK_CHARS_PER_TOKEN = {PROMPT_ENCODING: 2.5, EMBEDDING_ENCODING: 1.8}
+CHARS_PER_TOKEN = _FALLBACK_CHARS_PER_TOKEN[PROMPT_ENCODING]
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _get_encoding(name: str):
+    if tiktoken is None:
+        return None
+    if name not in _encodings:
+        with _encodings_lock:
+            if name not in _encodings:
+                try:
+                    _encodings[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    # Remembered, so a missing BPE download is not retried per call
+                    logger.warning(f"⚠️ tiktoken encoding {name} unavailable, estimating tokens: {e}")
+                    _encodings[name] = None
+    return _encodings[name]
+
+
+def count_tokens(text: str, encoding: str = PROMPT_ENCODING) -> int:
+    """Count (or, without tiktoken, estimate) the tokens in text"""
+    if not text:
+        return 0
+    encoder = _get_encoding(encoding)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    chars_per_token = _FALLBACK_CHARS_PER_TOKEN.get(encoding, CHARS_PER_TOKEN)
+    return max(1, math.ceil(len(text) / chars_per_token))
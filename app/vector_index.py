@@ -0,0 +1,246 @@
+import logging
+import threading
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of vectors with every row scaled to unit length"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Zero rows stay zero so they can never outrank a real match
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class VectorIndex:
+    """In-memory embedding index backed by one contiguous float32 matrix.
+
+    Vectors are normalized once on insert, so cosine similarity for a query
+    is a single matrix-vector product followed by an ``argpartition`` top-k.
+    Rows are addressed by caller-supplied integer ids.
+
+    For large corpora an ANN index (see ``ann_index``) can be attached with
+    ``set_ann``; search then scores only the rows it proposes. Without one,
+    a quantizer (see ``quantization``) attached with ``set_quantizer`` scans
+    compact codes instead of the float32 matrix and only a shortlist is
+    rescored exactly. Any add or remove drops both and returns to exact search.
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.zeros((max(initial_capacity, 1), dim), dtype=np.float32)
+        self._ids = np.zeros(max(initial_capacity, 1), dtype=np.int64)
+        self._size = 0
+        self._id_to_row = {}
+        self._ann = None
+        self._quantizer = None
+        self._shortlist = 100
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_normalized(cls, ids: Sequence[int], matrix: np.ndarray) -> "VectorIndex":
+        """Wrap an already-normalized float32 matrix without copying it.
+
+        Used for memory-mapped stores: the index reads straight from the
+        mapped pages and only copies them if vectors are later added or removed.
+        """
+        if matrix.dtype != np.float32 or matrix.ndim != 2:
+            raise ValueError("Expected a 2-D float32 matrix")
+        if len(ids) != matrix.shape[0]:
+            raise ValueError("ids and matrix must have the same length")
+
+        index = cls(dim=matrix.shape[1], initial_capacity=1)
+        index._matrix = matrix
+        index._ids = np.asarray(ids, dtype=np.int64)
+        index._size = matrix.shape[0]
+        index._id_to_row = {int(item_id): row for row, item_id in enumerate(index._ids)}
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._id_to_row
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Ids of the stored vectors, in row order"""
+        return self._ids[: self._size]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Normalized vectors, one row per stored id"""
+        return self._matrix[: self._size]
+
+    @property
+    def ann(self):
+        """Attached ANN index, or None for exact search"""
+        return self._ann
+
+    def set_ann(self, ann) -> None:
+        """Use an ANN index built over the current rows for candidate generation"""
+        with self._lock:
+            self._ann = ann
+
+    @property
+    def quantizer(self):
+        """Attached quantizer, or None"""
+        return self._quantizer
+
+    def set_quantizer(self, quantizer, shortlist: int = 100) -> None:
+        """Scan quantized codes of the current rows, rescoring ``shortlist`` exactly"""
+        with self._lock:
+            self._quantizer = quantizer
+            self._shortlist = shortlist
+
+    def _drop_derived_indexes(self):
+        if self._ann is not None or self._quantizer is not None:
+            logger.info("🧮 Vectors changed - dropping ANN index and codes, using exact search")
+            self._ann = None
+            self._quantizer = None
+
+    def _ensure_capacity(self, extra: int):
+        required = self._size + extra
+        capacity = self._matrix.shape[0]
+        if required <= capacity and self._matrix.flags.writeable:
+            return
+
+        new_capacity = max(required, capacity * 2)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        self._matrix = matrix
+        self._ids = ids
+
+    def add(self, ids: Sequence[int], vectors) -> None:
+        """Add or replace vectors for the given ids"""
+        vectors = normalize_rows(vectors)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("ids and vectors must have the same length")
+        if vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}"
+            )
+
+        with self._lock:
+            self._drop_derived_indexes()
+            if not self._matrix.flags.writeable:
+                # Detach from a read-only (memory-mapped) matrix before mutating
+                self._ensure_capacity(0)
+
+            new_rows = []
+            for position, item_id in enumerate(ids):
+                item_id = int(item_id)
+                row = self._id_to_row.get(item_id)
+                if row is not None:
+                    self._matrix[row] = vectors[position]
+                else:
+                    new_rows.append(position)
+
+            if not new_rows:
+                return
+
+            self._ensure_capacity(len(new_rows))
+            start = self._size
+            end = start + len(new_rows)
+            self._matrix[start:end] = vectors[new_rows]
+            for offset, position in enumerate(new_rows):
+                item_id = int(ids[position])
+                self._ids[start + offset] = item_id
+                self._id_to_row[item_id] = start + offset
+            self._size = end
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """Remove vectors by id, returning how many were removed"""
+        with self._lock:
+            rows = [self._id_to_row[int(i)] for i in ids if int(i) in self._id_to_row]
+            if not rows:
+                return 0
+
+            self._drop_derived_indexes()
+            if not self._matrix.flags.writeable:
+                self._ensure_capacity(0)
+
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            remaining = int(keep.sum())
+
+            self._matrix[:remaining] = self._matrix[: self._size][keep]
+            self._ids[:remaining] = self._ids[: self._size][keep]
+            self._size = remaining
+            self._id_to_row = {
+                int(item_id): row for row, item_id in enumerate(self._ids[:remaining])
+            }
+            return len(rows)
+
+    def search(self, query, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to top_k (id, cosine similarity) pairs, best first"""
+        with self._lock:
+            if self._size == 0 or top_k <= 0:
+                return []
+
+            query_vector = normalize_rows(query)[0]
+            if self._ann is not None:
+                return self._search_candidates(query_vector, top_k)
+            if self._quantizer is not None:
+                return self._search_quantized(query_vector, top_k)
+
+            scores = self._matrix[: self._size] @ query_vector
+
+            k = min(top_k, self._size)
+            if k < self._size:
+                top_rows = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top_rows = np.arange(self._size)
+            top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+            return [
+                (int(self._ids[row]), float(scores[row])) for row in top_rows
+            ]
+
+    def _search_candidates(self, query_vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Exact scores for the rows proposed by the ANN index"""
+        rows = np.unique(self._ann.candidates(query_vector, top_k))
+        rows = rows[(rows >= 0) & (rows < self._size)]
+        scores = self._matrix[rows] @ query_vector
+        order = np.argsort(-scores)[:top_k]
+        return [(int(self._ids[rows[i]]), float(scores[i])) for i in order]
+
+    def _search_quantized(self, query_vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Approximate scores over the codes, exact float32 rescoring of a shortlist"""
+        approx = self._quantizer.scores(query_vector)[: self._size]
+        shortlist = min(max(top_k, self._shortlist), self._size)
+        if shortlist < self._size:
+            rows = np.argpartition(-approx, shortlist - 1)[:shortlist]
+        else:
+            rows = np.arange(self._size)
+        rows.sort()  # sequential reads from a memory-mapped matrix
+        scores = self._matrix[rows] @ query_vector
+        order = np.argsort(-scores)[:top_k]
+        return [(int(self._ids[rows[i]]), float(scores[i])) for i in order]
+
+    def score(self, query, ids: Sequence[int]) -> Dict[int, float]:
+        """Cosine similarity of the query to specific ids (missing ids are skipped)"""
+        with self._lock:
+            rows = [self._id_to_row[int(i)] for i in ids if int(i) in self._id_to_row]
+            if not rows:
+                return {}
+            query_vector = normalize_rows(query)[0]
+            scores = self._matrix[rows] @ query_vector
+            return {
+                int(self._ids[row]): float(score) for row, score in zip(rows, scores)
+            }
+
+    def get_vector(self, item_id: int) -> Optional[np.ndarray]:
+        """Return the normalized vector stored for an id"""
+        row = self._id_to_row.get(int(item_id))
+        if row is None:
+            return None
+        return self._matrix[row]
@@ -0,0 +1,131 @@
+"""Shrinks scanned page images before they are sent to the vision model.
+
+A full-resolution RGB PNG of a text page is mostly blank margin, colour the
+model does not need and lossless detail it cannot use: the API downsizes to
+2048 px on the long edge anyway. Cropping to the printed area, dropping to
+grayscale, capping the long edge and encoding as JPEG/WebP cuts the upload
+by an order of magnitude, and the smaller area needs fewer vision tiles.
+"""
+
+import io
+import os
+import base64
+import logging
+from typing import NamedTuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+DETAIL_LEVELS = ("auto", "low", "high")
+
+
+class VisionImageSettings(NamedTuple):
+    autocrop: bool = True
+    crop_threshold: int = 200  # pixels darker than this count as content
+    crop_margin: int = 16
+    grayscale: bool = True
+    max_edge: int = 2048  # 0 keeps the rendered size
+    image_format: str = "jpeg"
+    quality: int = 80
+    detail: str = "auto"
+
+
+class EncodedImage(NamedTuple):
+    data_url: str
+    size_bytes: int
+    width: int
+    height: int
+
+
+def vision_image_settings() -> VisionImageSettings:
+    """Settings from VISION_* environment variables"""
+    image_format = os.getenv("VISION_IMAGE_FORMAT", "jpeg").lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(
+            f"Unknown VISION_IMAGE_FORMAT {image_format!r}, expected one of {IMAGE_FORMATS}"
+        )
+    detail = os.getenv("VISION_DETAIL", "auto").lower()
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown VISION_DETAIL {detail!r}, expected one of {DETAIL_LEVELS}")
+
+    return VisionImageSettings(
+        autocrop=os.getenv("VISION_AUTOCROP", "true").lower() == "true",
+        crop_threshold=int(os.getenv("VISION_CROP_THRESHOLD", "200")),
+        crop_margin=int(os.getenv("VISION_CROP_MARGIN", "16")),
+        grayscale=os.getenv("VISION_GRAYSCALE", "true").lower() == "true",
+        max_edge=int(os.getenv("VISION_MAX_EDGE", "2048")),
+        image_format=image_format,
+        quality=int(os.getenv("VISION_IMAGE_QUALITY", "80")),
+        detail=detail,
+    )
+
+
+def crop_to_content(image: Image.Image, threshold: int = 200, margin: int = 16) -> Image.Image:
+    """Trim the blank margins around the printed area of a page"""
+    gray = image if image.mode == "L" else image.convert("L")
+    # Content mask: dark pixels become 255, paper becomes 0
+    box = gray.point(lambda value: 255 if value < threshold else 0).getbbox()
+    if box is None:
+        return image  # blank page
+
+    left, top, right, bottom = box
+    box = (
+        max(0, left - margin),
+        max(0, top - margin),
+        min(image.width, right + margin),
+        min(image.height, bottom + margin),
+    )
+    if box == (0, 0, image.width, image.height):
+        return image
+    return image.crop(box)
+
+
+def prepare_page_image(image: Image.Image, settings: VisionImageSettings) -> Image.Image:
+    """Crop, convert and downscale a page; returns a new image"""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if settings.grayscale and image.mode != "L":
+        image = image.convert("L")
+    if settings.autocrop:
+        image = crop_to_content(image, settings.crop_threshold, settings.crop_margin)
+    if settings.max_edge and max(image.size) > settings.max_edge:
+        scale = settings.max_edge / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.LANCZOS,
+        )
+    return image
+
+
+def encode_page_image(image: Image.Image, settings: VisionImageSettings) -> EncodedImage:
+    """Prepared page as a base64 data URL for an ``image_url`` message part"""
+    prepared = prepare_page_image(image, settings)
+    image_format = settings.image_format
+
+    buffer = io.BytesIO()
+    try:
+        if image_format == "png":
+            prepared.save(buffer, format="PNG", optimize=True)
+        else:
+            prepared.save(buffer, format=image_format.upper(), quality=settings.quality)
+    except (KeyError, OSError) as e:
+        # Pillow built without WebP support
+        logger.warning(f"⚠️ Could not encode page as {image_format}, using JPEG: {e}")
+        image_format = "jpeg"
+        buffer = io.BytesIO()
+        prepared.save(buffer, format="JPEG", quality=settings.quality)
+
+    data = buffer.getvalue()
+    width, height = prepared.size
+    if prepared is not image:
+        prepared.close()
+    return EncodedImage(
+        data_url=f"data:image/{image_format};base64,{base64.b64encode(data).decode('utf-8')}",
+        size_bytes=len(data),
+        width=width,
+        height=height,
+    )
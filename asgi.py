@@ -0,0 +1,7 @@
+from app.asgi import application
+
+if __name__ == "__main__":
+    import os
+    import uvicorn
+
+    uvicorn.run(application, host="0.0.0.0", port=int(os.environ.get("PORT", 5002)))
@@ -0,0 +1,39 @@
+import os
+import threading
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5002')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+timeout = 120
+
+# Async workers: an /ask stream awaits the API instead of pinning a worker, so
+# each worker holds many concurrent streams. Use "sync" with wsgi:app instead.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+
+# Build the RAG index once in the master before forking, so workers start
+# warm and share the loaded index copy-on-write. Set RAG_PRELOAD=false to
+# load it in each worker instead.
+preload_app = os.environ.get("RAG_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before workers are forked"""
+    if preload_app:
+        from app.main import warm_up_rag
+
+        warm_up_rag()
+
+
+def post_fork(server, worker):
+    """Each worker needs its own API connections, not the master's"""
+    if preload_app:
+        from app.main import reset_rag_after_fork
+
+        reset_rag_after_fork()
+
+
+def post_worker_init(worker):
+    """Without preloading, warm up in the background; /ready stays 503 until done"""
+    if not preload_app:
+        from app.main import warm_up_rag
+
+        threading.Thread(target=warm_up_rag, daemon=True).start()
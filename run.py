@@ -1,9 +1,24 @@
 import os
-from app.main import app
+import threading
+from app.main import app, warm_up_rag
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5002))
     host = os.environ.get("HOST", "0.0.0.0")
     debug = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
 
-    app.run(host=host, port=port, debug=debug, use_reloader=False)
+    if uvicorn is not None and not debug:
+        # Async server: /ask streams concurrently; the ASGI lifespan warms up the index
+        from app.asgi import application
+
+        uvicorn.run(application, host=host, port=port)
+    else:
+        # Load the RAG index in the background; /ready reports 503 until it is done
+        threading.Thread(target=warm_up_rag, daemon=True).start()
+
+        app.run(host=host, port=port, debug=debug, use_reloader=False)
@@ -0,0 +1,82 @@
+import pytest
+
+from app.entity_index import EntityIndex, extract_entities, normalize_phone
+
+
+def phones(text):
+    return {entity for entity in extract_entities(text) if entity.startswith("phone:")}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ĐT: 0290.3831.234", {"phone:02903831234"}),
+        ("ĐT: 0290.3831.234 - 0290.3831.235", {"phone:02903831234", "phone:02903831235"}),
+        ("Điện thoại 0290.3831.234, 0912 345 678", {"phone:02903831234", "phone:0912345678"}),
+        ("Tel.0290.3831.234", {"phone:02903831234"}),
+        ("2393.853.210", {"phone:02393853210"}),
+        ("912 345 678", {"phone:0912345678"}),
+        ("+84 912 345 678", {"phone:0912345678"}),
+        ("+84912345678", {"phone:0912345678"}),
+        ("(0290) 3831 234", {"phone:02903831234"}),
+        ("0912-345-678", {"phone:0912345678"}),
+        ("02993869933", {"phone:02993869933"}),
+        # Shapes written in data/
+        ("02133.792.919", {"phone:02133792919"}),
+        ("02073.822.830", {"phone:02073822830"}),
+        ("(0222) 3.825.637", {"phone:02223825637"}),
+        ("(0222)\u202f3.825.637", {"phone:02223825637"}),
+        ("02703.822 115", {"phone:02703822115"}),
+        ("0299  3876272", {"phone:02993876272"}),
+        ("02923 850844", {"phone:02923850844"}),
+        ("khu vực 2 0290.3831.234", {"phone:02903831234"}),
+    ],
+)
+def test_phone_formats(text, expected):
+    assert phones(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Ngày 12.05.2023",
+        "Số tiền 1.250.000.000 đồng",
+        "Quyết định số 125.000.000",
+        "Điều 12 khoản 3",
+    ],
+)
+def test_non_phone_numbers_are_ignored(text):
+    assert phones(text) == set()
+
+
+def test_normalize_phone_rejects_wrong_lengths():
+    assert normalize_phone("0290.383") == ""
+    assert normalize_phone("123 456 789") == ""
+    assert normalize_phone("+84 912 345 678") == "0912345678"
+
+
+def test_corpus_phone_lookup():
+    index = EntityIndex()
+    index.build(["Số điện thoại: 02133.792.919", "Số điện thoại: 02073.822.830"])
+    assert index.lookup("số điện thoại 02133.792.919") == {"phone:02133792919": {0}}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "Địa chỉ: số 227, đường Nguyễn Huy Tự, phường Thành Sen, tỉnh Hà Tĩnh",
+            {"address:nguyen huy tu", "address:thanh sen"},
+        ),
+        ("thôn Đồng Tiến, xã Kỳ Anh, tỉnh Hà Tĩnh", {"address:ky anh"}),
+        (
+            "số 124 đường Nguyễn Thái Học, phường Hà Giang 2",
+            {"address:nguyen thai hoc", "address:ha giang 2"},
+        ),
+        ("CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM", set()),
+        ("22 đơn vị hành chính cấp xã thuộc tỉnh Hà Tĩnh", set()),
+    ],
+)
+def test_addresses(text, expected):
+    addresses = {entity for entity in extract_entities(text) if entity.startswith("address:")}
+    assert addresses == expected